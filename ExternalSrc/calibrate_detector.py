@@ -0,0 +1,194 @@
+"""Face detector backend calibration.
+
+Times every available DETECTOR_BACKENDS backend on sample frames laid out
+like the enrollment gallery (<faces_dir>/<name>/*.jpg, one visible face
+per image) and writes the fastest backend that reaches the recall target
+to detector.json, which start_camera picks up on the next start:
+
+    python calibrate_detector.py faces --recall 0.95
+    python calibrate_detector.py faces --negatives empty_frames --max-false 0.05 --model yunet=yunet.onnx
+
+A face frame only counts as found when a box of plausible size lies on the
+sample image (not just anywhere in the frame), and with --negatives a
+backend whose false detections per empty frame exceed --max-false is not
+selected.
+
+Run it on the stand itself; the ranking depends on the CPU. Backends whose
+model file is missing are skipped.
+"""
+
+import argparse
+import os
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from enroll import IMAGE_EXTS, _atomic_write_json, scan_faces
+from faceRec import DETECTOR_BACKENDS, FaceFinder, load_detector
+
+
+# a found face must be at least this fraction of the sample image's shorter side
+MIN_FACE_FRACTION = 0.1
+# and have at least this fraction of its area on the sample image
+MIN_FACE_OVERLAP = 0.5
+
+Box = Tuple[int, int, int, int]
+
+
+def load_frames(paths: List[str], size: Tuple[int, int]) -> Tuple[List[np.ndarray], List[Box]]:
+    """Images letterboxed to the camera frame size, as run_inference sees them,
+    and the (x, y, w, h) area each image covers in its frame."""
+    frames, regions = [], []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        W, H = size
+        scale = min(W / img.shape[1], H / img.shape[0])
+        w, h = int(img.shape[1] * scale), int(img.shape[0] * scale)
+        frame = np.zeros((H, W, 3), dtype=np.uint8)
+        x, y = (W - w) // 2, (H - h) // 2
+        frame[y:y+h, x:x+w] = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+        regions.append((x, y, w, h))
+    return frames, regions
+
+
+def plausible_face(box: Box, region: Box) -> bool:
+    """Box big enough to be the sample's face and mostly on the sample image."""
+    x, y, w, h = box
+    rx, ry, rw, rh = region
+    if min(w, h) < MIN_FACE_FRACTION * min(rw, rh):
+        return False
+    ix = max(0, min(x + w, rx + rw) - max(x, rx))
+    iy = max(0, min(y + h, ry + rh) - max(y, ry))
+    return ix * iy >= MIN_FACE_OVERLAP * w * h
+
+
+def measure(finder: FaceFinder, frames: List[np.ndarray], repeats: int) -> Tuple[List[List[Box]], List[float]]:
+    """Boxes found per frame and full-frame detection time per frame (best of repeats)."""
+    found, times = [], []
+    for f in frames:
+        best = None
+        for _ in range(repeats):
+            finder.reset()  # no ROI tracking: every frame is a full-frame detection
+            t = time.perf_counter()
+            _, boxes = finder.find(f)
+            elapsed = time.perf_counter() - t
+            best = elapsed if best is None else min(best, elapsed)
+        found.append(boxes)
+        times.append(best)
+    return found, times
+
+
+def calibrate(
+    faces_dir: str,
+    negatives_dir: Optional[str] = None,
+    recall_target: float = 0.95,
+    max_false: float = 0.1,
+    size: Tuple[int, int] = (840, 480),
+    detect_scale: float = 0.5,
+    repeats: int = 3,
+    models: Optional[Dict[str, str]] = None,
+) -> Optional[dict]:
+    """Returns the chosen backend's result dict, or None if no backend loaded.
+
+    Backends over max_false false detections per empty frame are only
+    chosen when every backend is.
+    """
+    models = models or {}
+    positives, regions = load_frames([p for paths in scan_faces(faces_dir).values() for p in paths], size)
+    if not positives:
+        raise SystemExit(f"No images under {faces_dir}/<name>/")
+    negatives = []
+    if negatives_dir:
+        negatives, _ = load_frames(
+            sorted(os.path.join(negatives_dir, f) for f in os.listdir(negatives_dir)
+                   if f.lower().endswith(IMAGE_EXTS)),
+            size,
+        )
+    print(f"{len(positives)} face frames, {len(negatives)} empty frames, {size[0]}x{size[1]}")
+
+    results = []
+    for backend in DETECTOR_BACKENDS:
+        try:
+            det = load_detector(backend, models.get(backend))
+        except (FileNotFoundError, cv2.error) as e:
+            print(f"{backend:<6} skipped: {e}")
+            continue
+        finder = FaceFinder(det, detect_scale=detect_scale)
+        found, times = measure(finder, positives, repeats)
+        false_found, false_times = measure(finder, negatives, repeats) if negatives else ([], [])
+        ordered = sorted(times + false_times)
+        result = {
+            "backend": backend,
+            "model": models.get(backend) or DETECTOR_BACKENDS[backend][0],
+            "recall": sum(
+                1 for boxes, region in zip(found, regions)
+                if any(plausible_face(b, region) for b in boxes)
+            ) / len(found),
+            "false_per_frame": statistics.fmean(len(b) for b in false_found) if false_found else None,
+            "latency_ms": statistics.fmean(ordered) * 1000,
+            "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000,
+        }
+        results.append(result)
+        false = "-" if result["false_per_frame"] is None else f"{result['false_per_frame']:.2f}"
+        print(f"{backend:<6} recall {result['recall']:.2f}  false/frame {false:>5}  "
+              f"mean {result['latency_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms")
+
+    if not results:
+        return None
+    clean = [r for r in results if r["false_per_frame"] is None or r["false_per_frame"] <= max_false]
+    if clean:
+        results = clean
+    else:
+        print(f"Every backend exceeds {max_false:.2f} false detections per frame.")
+    passing = [r for r in results if r["recall"] >= recall_target]
+    if passing:
+        chosen = min(passing, key=lambda r: r["latency_ms"])
+    else:
+        chosen = max(results, key=lambda r: (r["recall"], -r["latency_ms"]))
+        print(f"No backend reaches recall {recall_target:.2f}; using the best recall.")
+    print(f"Selected {chosen['backend']}")
+    return chosen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the fastest face detector that meets a recall target")
+    parser.add_argument("faces_dir", help="<faces_dir>/<name>/*.jpg, one visible face per image")
+    parser.add_argument("--negatives", help="directory of frames without faces (false detections)")
+    parser.add_argument("--recall", type=float, default=0.95)
+    parser.add_argument("--max-false", type=float, default=0.1,
+                        help="most false detections per --negatives frame a selected backend may have")
+    parser.add_argument("--size", type=int, nargs=2, default=[840, 480], help="camera frame size")
+    parser.add_argument("--detect-scale", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model", action="append", default=[], metavar="BACKEND=PATH",
+                        help="model file for a backend, e.g. yunet=face_detection_yunet_2023mar.onnx")
+    parser.add_argument("--output", default="detector.json")
+    parser.add_argument("--dry-run", action="store_true", help="report only, keep the current choice")
+    args = parser.parse_args()
+
+    models = dict(m.split("=", 1) for m in args.model)
+    chosen = calibrate(
+        args.faces_dir,
+        negatives_dir=args.negatives,
+        recall_target=args.recall,
+        max_false=args.max_false,
+        size=tuple(args.size),
+        detect_scale=args.detect_scale,
+        repeats=args.repeats,
+        models=models,
+    )
+    if chosen is None:
+        raise SystemExit("No detector backend could be loaded.")
+    if not args.dry_run:
+        _atomic_write_json(args.output, dict(chosen, calibrated_at=time.strftime("%Y-%m-%dT%H:%M:%S")))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Face gallery enrollment.
+
+Builds or incrementally updates lbph.yml / labels.json from a directory of
+face images laid out as <faces_dir>/<name>/*.jpg:
+
+    python enroll.py faces --model lbph.yml --labels labels.json
+
+Only images not seen before (tracked in the manifest) are preprocessed and
+added with LBPHFaceRecognizer.update; pass --full to retrain from scratch.
+Outputs are replaced atomically so a running stand can hot-reload them.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".pgm")
+
+_worker_det = None  # per-process cascade, set by _init_worker
+
+
+def _init_worker(cascade_path: str) -> None:
+    global _worker_det
+    _worker_det = cv2.CascadeClassifier(cascade_path)
+    if _worker_det.empty():
+        raise FileNotFoundError(f"Failed to load cascade: {cascade_path}")
+
+
+def preprocess_image(
+    path: str,
+    roi_size: Tuple[int, int] = (300, 300),
+    scale_factor: float = 1.2,
+    min_neighbors: int = 5,
+    min_face: Tuple[int, int] = (20, 20),
+) -> Optional[np.ndarray]:
+    """Detect the largest face, crop, grayscale and resize like run_inference."""
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    faces = _worker_det.detectMultiScale(img, scale_factor, min_neighbors, minSize=min_face)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda b: b[2] * b[3])
+    return cv2.resize(img[y:y+h, x:x+w], roi_size)
+
+
+def _preprocess_job(args):
+    path, roi_size = args
+    return path, preprocess_image(path, roi_size)
+
+
+def scan_faces(faces_dir: str) -> Dict[str, List[str]]:
+    """name -> sorted image paths"""
+    found = {}
+    for name in sorted(os.listdir(faces_dir)):
+        user_dir = os.path.join(faces_dir, name)
+        if not os.path.isdir(user_dir):
+            continue
+        paths = sorted(
+            os.path.join(user_dir, f) for f in os.listdir(user_dir)
+            if f.lower().endswith(IMAGE_EXTS)
+        )
+        if paths:
+            found[name] = paths
+    return found
+
+
+def _file_key(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _atomic_write_json(path: str, obj) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_write_model(rec, path: str) -> None:
+    # keep the .yml suffix on the temp file so OpenCV picks the YAML format
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{ext}"
+    rec.write(tmp)
+    os.replace(tmp, path)
+
+
+def enroll(
+    faces_dir: str,
+    model_path: str = "lbph.yml",
+    labels_path: str = "labels.json",
+    manifest_path: str = "enroll_manifest.json",
+    cascade_path: str = "haarcascade_frontalface_default.xml",
+    roi_size: Tuple[int, int] = (300, 300),
+    workers: Optional[int] = None,
+    full: bool = False,
+) -> int:
+    """Enroll new images; returns the number of samples added to the model."""
+    found = scan_faces(faces_dir)
+    labels: Dict[str, int] = _load_json(labels_path, {})
+    manifest: Dict[str, List[int]] = _load_json(manifest_path, {})
+
+    current = {p: _file_key(p) for paths in found.values() for p in paths}
+    changed = [p for p, key in manifest.items() if current.get(p) not in (None, key)]
+    removed = [p for p in manifest if p not in current]
+    if not os.path.exists(model_path):
+        full = True
+    if changed or removed:
+        print(f"{len(changed)} changed / {len(removed)} removed images, retraining from scratch.")
+        full = True
+    if full:
+        manifest = {}
+
+    todo = [p for p in current if p not in manifest]
+    if not todo:
+        print("Nothing to enroll.")
+        return 0
+
+    next_id = max(labels.values(), default=-1) + 1
+    for name in found:
+        if name not in labels:
+            labels[name] = next_id
+            next_id += 1
+    path_label = {p: labels[name] for name, paths in found.items() for p in paths}
+
+    images, image_labels = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cascade_path,)) as pool:
+        jobs = [(p, roi_size) for p in todo]
+        for path, face in pool.map(_preprocess_job, jobs, chunksize=8):
+            if face is None:
+                print(f"No face found, skipped: {path}")
+                continue
+            images.append(face)
+            image_labels.append(path_label[path])
+            manifest[path] = current[path]
+
+    if not images:
+        print("No usable faces found.")
+        return 0
+
+    rec = cv2.face.LBPHFaceRecognizer_create()
+    if full:
+        rec.train(images, np.array(image_labels, dtype=np.int32))
+    else:
+        rec.read(model_path)
+        rec.update(images, np.array(image_labels, dtype=np.int32))
+
+    # model first, then labels: a reader between the two writes sees the new
+    # model with the old labels. That is safe because label ids are only ever
+    # appended (existing names keep their id), so faces of users enrolled in
+    # this run predict ids the old labels lack and are rejected as unknown,
+    # while everyone else still maps to the right name.
+    _atomic_write_model(rec, model_path)
+    _atomic_write_json(labels_path, labels)
+    _atomic_write_json(manifest_path, manifest)
+    print(f"Enrolled {len(images)} images ({'full' if full else 'incremental'}), "
+          f"{len(labels)} users.")
+    return len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll face images into the LBPH gallery")
+    parser.add_argument("faces_dir")
+    parser.add_argument("--model", default="lbph.yml")
+    parser.add_argument("--labels", default="labels.json")
+    parser.add_argument("--manifest", default="enroll_manifest.json")
+    parser.add_argument("--cascade", default="haarcascade_frontalface_default.xml")
+    parser.add_argument("--roi", type=int, nargs=2, default=[300, 300])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true", help="retrain from scratch")
+    args = parser.parse_args()
+
+    enroll(
+        args.faces_dir,
+        model_path=args.model,
+        labels_path=args.labels,
+        manifest_path=args.manifest,
+        cascade_path=args.cascade,
+        roi_size=tuple(args.roi),
+        workers=args.workers,
+        full=args.full,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,1054 @@
+import abc
 import json
+import os
+import queue
+import threading
 import time
-from typing import Dict, Optional, Tuple, List
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, List, Union
 import cv2
-from picamera2 import Picamera2
 import numpy as np
 
+# UMBRELLA_BACKEND=sim serves frames from sim_backend instead of the Pi camera;
+# UMBRELLA_DISPLAY=0 disables the HighGUI window (headless runs)
+if os.environ.get("UMBRELLA_BACKEND", "rpi") == "sim":
+    from sim_backend import Picamera2
+else:
+    from picamera2 import Picamera2
+DISPLAY = os.environ.get("UMBRELLA_DISPLAY", "1") != "0"
 
-def start_camera(
-    size: Tuple[int, int] = (840, 480),
-    pixel_format: str = "RGB888",
-    cascade_path: str = "haarcascade_frontalface_default.xml",
-    lbph_path: str = "lbph.yml",
-    labels_path: str = "labels.json",
-):
+from metrics import counter, histogram
+from model_cache import load_model
+
+# per-stage latency of the recognition loop (run_inference and the pipelined variant)
+STAGE_SECONDS = {
+    stage: histogram("umbrella_inference_stage_seconds", "Recognition loop stage latency", stage=stage)
+    for stage in ("capture", "detect", "recognize", "decide", "display")
+}
+
+
+class LazyRecognizer:
+    """Recognizer that is still loading in the background.
+
+    predict/predict_batch block until the model is ready, so the camera and
+    detector can start serving frames while the gallery loads.
+    """
+
+    def __init__(self, future: "Future"):
+        self._future = future
+
+    def ready(self) -> bool:
+        return self._future.done()
+
+    def get(self):
+        return self._future.result()
+
+    def predict(self, g: np.ndarray):
+        return self.get().predict(g)
+
+    def predict_batch(self, faces):
+        rec = self.get()
+        if hasattr(rec, "predict_batch"):
+            return rec.predict_batch(faces)
+        return [rec.predict(g) for g in faces]
+
+
+def _open_camera(size: Tuple[int, int], pixel_format: str) -> Picamera2:
     p = Picamera2()
     cfg = p.create_preview_configuration(main={"format": pixel_format, "size": size})
     p.configure(cfg)
     p.start()
+    return p
+
 
+def _load_cascade(cascade_path: str) -> cv2.CascadeClassifier:
     det = cv2.CascadeClassifier(cascade_path)
     if det.empty():
         raise FileNotFoundError(f"Failed to load cascade: {cascade_path}")
+    return det
+
+
+class FaceDetector(abc.ABC):
+    """Detector backend used by FaceFinder.
+
+    detect(img, min_size) returns (x, y, w, h) boxes in img coordinates.
+    img is grayscale, or the camera's 3-channel frame when color is True.
+    """
 
-    rec = cv2.face.LBPHFaceRecognizer_create()
-    rec.read(lbph_path)
+    name = "detector"
+    color = False
 
+    @abc.abstractmethod
+    def detect(self, img: np.ndarray, min_size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+        ...
+
+
+class CascadeDetector(FaceDetector):
+    """cv2.CascadeClassifier backend (Haar or LBP features)."""
+
+    def __init__(
+        self,
+        cascade,
+        *,
+        name: str = "haar",
+        scale_factor: float = 1.2,
+        min_neighbors: int = 5,
+    ):
+        self.cascade = _load_cascade(cascade) if isinstance(cascade, str) else cascade
+        self.name = name
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, img, min_size):
+        faces = self.cascade.detectMultiScale(
+            img, self.scale_factor, self.min_neighbors, minSize=min_size
+        )
+        return [(int(x), int(y), int(w), int(h)) for (x, y, w, h) in faces]
+
+
+class YuNetDetector(FaceDetector):
+    """cv2.FaceDetectorYN backend (small CNN run through cv2.dnn on the CPU).
+
+    Finds turned and tilted faces the frontal cascades miss. The input size
+    follows each image, so ROI crops work as well as full frames.
+    """
+
+    name = "yunet"
+    color = True
+
+    def __init__(self, model_path: str, *, score_threshold: float = 0.7, nms_threshold: float = 0.3):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Failed to load detector model: {model_path}")
+        self.net = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold)
+        self._size = (320, 320)
+
+    def detect(self, img, min_size):
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        H, W = img.shape[:2]
+        if (W, H) != self._size:
+            self.net.setInputSize((W, H))
+            self._size = (W, H)
+        _, faces = self.net.detect(img)
+        boxes = []
+        for x, y, w, h in (faces[:, :4] if faces is not None else []):
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            w, h = min(int(x + w), W) - x0, min(int(y + h), H) - y0
+            if w >= min_size[0] and h >= min_size[1]:
+                boxes.append((x0, y0, w, h))
+        return boxes
+
+
+# backend name -> (default model file, factory(model_path))
+DETECTOR_BACKENDS = {
+    "haar": ("haarcascade_frontalface_default.xml", lambda path: CascadeDetector(path, name="haar")),
+    "lbp": ("lbpcascade_frontalface_improved.xml", lambda path: CascadeDetector(path, name="lbp")),
+    "yunet": ("face_detection_yunet_2023mar.onnx", YuNetDetector),
+}
+
+
+def load_detector(backend: str = "haar", model_path: Optional[str] = None) -> FaceDetector:
+    """Build a DETECTOR_BACKENDS backend; raises FileNotFoundError if its model is missing."""
+    default_path, factory = DETECTOR_BACKENDS[backend]
+    return factory(model_path or default_path)
+
+
+def _load_detector_config(config_path: Optional[str], cascade_path: str) -> FaceDetector:
+    """Backend chosen by calibrate_detector.py, or the Haar cascade without one."""
+    if config_path and os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        try:
+            return load_detector(cfg["backend"], cfg.get("model"))
+        except (KeyError, FileNotFoundError, cv2.error) as e:
+            print(f"Detector config {config_path} unusable ({e}), using Haar cascade")
+    return CascadeDetector(cascade_path)
+
+
+def _load_recognizer(lbph_path: str, model_cache_dir: Optional[str]):
+    if model_cache_dir is None:
+        rec = cv2.face.LBPHFaceRecognizer_create()
+        rec.read(lbph_path)
+        return rec
+    matcher, _ = load_model(lbph_path, model_cache_dir)
+    return matcher
+
+
+def start_camera(
+    size: Tuple[int, int] = (840, 480),
+    pixel_format: str = "RGB888",
+    cascade_path: str = "haarcascade_frontalface_default.xml",
+    lbph_path: str = "lbph.yml",
+    labels_path: str = "labels.json",
+    model_cache_dir: Optional[str] = "model_cache",
+    lazy: bool = True,
+    detector_config: Optional[str] = "detector.json",
+):
+    """Start the camera and load the detector and recognizer in parallel.
+
+    The detector backend comes from detector_config (written by
+    calibrate_detector.py) when it exists, else the cascade_path Haar
+    cascade is used. With model_cache_dir the recognizer is an LBPHMatcher
+    loaded from the compiled cache (built from lbph_path on first use); None
+    keeps the stock OpenCV recognizer. With lazy=True the recognizer is
+    returned as a LazyRecognizer while it is still loading.
+    """
+    pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+    camera = pool.submit(_open_camera, size, pixel_format)
+    cascade = pool.submit(_load_detector_config, detector_config, cascade_path)
+    model = pool.submit(_load_recognizer, lbph_path, model_cache_dir)
+    pool.shutdown(wait=False)
+
+    id2name = _load_labels(labels_path)
+
+    p = camera.result()
+    det = cascade.result()
+    rec = LazyRecognizer(model) if lazy else model.result()
+
+    return p, det, rec, id2name
+
+
+def _load_labels(labels_path: str) -> Dict[int, str]:
     with open(labels_path, "r", encoding="utf-8") as f:
         m = json.load(f)
-    id2name: Dict[int, str] = {v: k for k, v in m.items()}
+    return {v: k for k, v in m.items()}
 
-    return p, det, rec, id2name
+
+class ModelReloader:
+    """Hot-reloads the recognizer and labels when enrollment replaces them.
+
+    current() is cheap to call every time recognition starts: it stats the
+    model and label files and, when they changed, loads the new pair on a
+    background thread, keeping the old one in use until the swap. It also
+    returns the user id of every enrolled name (user_ids, e.g. main.py's
+    stand_config face -> user mapping; names not listed keep their own name
+    as id), which is what recognition accepts, so a newly enrolled person is
+    recognized without a restart.
+    """
+
+    def __init__(
+        self,
+        rec,
+        id2name: Dict[int, str],
+        lbph_path: str = "lbph.yml",
+        labels_path: str = "labels.json",
+        model_cache_dir: Optional[str] = "model_cache",
+        user_ids: Optional[Dict[str, str]] = None,
+    ):
+        self.rec = rec
+        self.id2name = id2name
+        self.name_to_user = dict(user_ids or {})
+        self.lbph_path = lbph_path
+        self.labels_path = labels_path
+        self.model_cache_dir = model_cache_dir
+        self._stamp = self._file_stamp()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-reload")
+        self._pending: Optional[Future] = None
+
+    def _file_stamp(self):
+        try:
+            return tuple(
+                (st.st_mtime_ns, st.st_size)
+                for st in (os.stat(self.lbph_path), os.stat(self.labels_path))
+            )
+        except OSError:
+            return None  # mid-replace or missing: keep the current model
+
+    def _load(self):
+        return _load_recognizer(self.lbph_path, self.model_cache_dir), _load_labels(self.labels_path)
+
+    def current(self):
+        if self._pending is not None and self._pending.done():
+            try:
+                self.rec, self.id2name = self._pending.result()
+                print(f"Face model reloaded ({len(self.id2name)} users)")
+            except Exception as e:
+                print(f"Face model reload failed: {e}")
+            self._pending = None
+
+        stamp = self._file_stamp()
+        if stamp is not None and stamp != self._stamp and self._pending is None:
+            self._stamp = stamp
+            self._pending = self._pool.submit(self._load)
+        return self.rec, self.id2name, enrolled_user_ids(self.id2name, self.name_to_user)
+
+
+def enrolled_user_ids(id2name: Dict[int, str], user_ids: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Recognizer name -> user id for every enrolled name (unmapped names map to themselves)."""
+    user_ids = user_ids or {}
+    return {name: user_ids.get(name, name) for name in id2name.values()}
+
+
+# returned by the voting mode when a face is confidently not enrolled
+UNKNOWN_USER = "unknown"
+
+
+class FaceFinder:
+    """Face detection on a downscaled frame with ROI tracking.
+
+    The frame is converted to grayscale once and downscaled by detect_scale
+    for the detector (color backends get the downscaled color frame); boxes
+    are mapped back to full resolution. det is a FaceDetector or a bare
+    cv2.CascadeClassifier. After a hit, later frames only search a padded
+    region around the previous faces, with a full-frame re-detect every
+    redetect_every frames or when tracking is lost.
+    """
+
+    def __init__(
+        self,
+        det: Union[FaceDetector, cv2.CascadeClassifier],
+        *,
+        min_face: Tuple[int, int] = (20, 20),
+        scale_factor: float = 1.2,
+        min_neighbors: int = 5,
+        detect_scale: float = 0.5,
+        roi_pad: float = 0.5,
+        redetect_every: int = 10,
+    ):
+        if isinstance(det, CascadeDetector):
+            det = CascadeDetector(
+                det.cascade, name=det.name, scale_factor=scale_factor, min_neighbors=min_neighbors
+            )
+        elif not isinstance(det, FaceDetector):
+            det = CascadeDetector(det, scale_factor=scale_factor, min_neighbors=min_neighbors)
+        self.det = det
+        self.detect_scale = detect_scale
+        self.roi_pad = roi_pad
+        self.redetect_every = redetect_every
+        self.min_face = (
+            max(1, int(round(min_face[0] * detect_scale))),
+            max(1, int(round(min_face[1] * detect_scale))),
+        )
+        self.reset()
+
+    def reset(self) -> None:
+        self._tracked: List[Tuple[int, int, int, int]] = []  # boxes in small-frame coords
+        self._since_full = 0
+
+    def _detect(self, small: np.ndarray, x0: int = 0, y0: int = 0):
+        return [(x + x0, y + y0, w, h) for (x, y, w, h) in self.det.detect(small, self.min_face)]
+
+    def _detect_tracked(self, small: np.ndarray):
+        H, W = small.shape[:2]
+        found = []
+        for (x, y, w, h) in self._tracked:
+            px, py = int(w * self.roi_pad), int(h * self.roi_pad)
+            x0, y0 = max(0, x - px), max(0, y - py)
+            x1, y1 = min(W, x + w + px), min(H, y + h + py)
+            found.extend(self._detect(small[y0:y1, x0:x1], x0, y0))
+        return found
+
+    def find(self, f: np.ndarray):
+        """Returns (gray, boxes) with gray the full-res grayscale frame and
+        boxes a list of (x, y, w, h) in full-res coordinates."""
+        gray = cv2.cvtColor(f, cv2.COLOR_RGB2GRAY) if f.ndim == 3 else f
+        small = f if self.det.color else gray
+        if self.detect_scale != 1.0:
+            small = cv2.resize(
+                small, None, fx=self.detect_scale, fy=self.detect_scale,
+                interpolation=cv2.INTER_AREA,
+            )
+
+        faces = []
+        if self._tracked and self._since_full < self.redetect_every:
+            faces = self._detect_tracked(small)
+            self._since_full += 1
+        if not faces:
+            faces = self._detect(small)
+            self._since_full = 0
+        self._tracked = faces
+
+        inv = 1.0 / self.detect_scale
+        H, W = gray.shape[:2]
+        boxes = []
+        for (x, y, w, h) in faces:
+            X, Y = min(int(x * inv), W - 1), min(int(y * inv), H - 1)
+            w, h = min(int(w * inv), W - X), min(int(h * inv), H - Y)
+            if w > 0 and h > 0:
+                boxes.append((X, Y, w, h))
+        return gray, boxes
+
+
+class MotionGate:
+    """Cheap frame-difference check ahead of detection and recognition.
+
+    Each frame is shrunk to size (area average, so sensor noise mostly
+    cancels out) and compared with the last frame that was actually
+    processed. If fewer than min_changed of the pixels moved by more than
+    pixel_delta grey levels, changed() returns False and the caller reuses
+    the previous boxes for display. At most max_skip frames in a row are
+    skipped.
+
+    The recognition loops only consult the gate while the last result had
+    no faces (nobody in front of the camera yet). While a face is tracked
+    every frame is recognized and votes, so the gate never slows down a
+    decision; it only saves detector runs on an empty scene.
+    """
+
+    def __init__(
+        self,
+        *,
+        size: Tuple[int, int] = (80, 60),
+        pixel_delta: int = 12,
+        min_changed: float = 0.01,
+        max_skip: int = 3,
+    ):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.min_changed = min_changed
+        self.max_skip = max_skip
+        self.reset()
+
+    def reset(self) -> None:
+        self._ref: Optional[np.ndarray] = None
+        self._skipped = 0
+
+    def changed(self, f: np.ndarray) -> bool:
+        small = cv2.resize(f, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        if self._ref is not None and self._skipped < self.max_skip:
+            moved = np.count_nonzero(cv2.absdiff(small, self._ref) > self.pixel_delta)
+            if moved < self.min_changed * small.size:
+                self._skipped += 1
+                return False
+        self._ref = small
+        self._skipped = 0
+        return True
+
+
+_GATED_FRAMES = {
+    result: counter("umbrella_inference_frames_total", "Frames seen by the recognition loop",
+                    result=result)
+    for result in ("processed", "skipped")
+}
+
+
+def _recognize_gated(f, gate: Optional[MotionGate], last, finder, rec, id2name,
+                     threshold, allowed_names, roi_size):
+    """(boxes, detected_user, fresh): _recognize, or the last (boxes,
+    detected_user) with fresh=False when the last result had no faces and
+    gate sees no motion."""
+    if gate is not None:
+        if last is not None and not last[0]:
+            if not gate.changed(f):
+                _GATED_FRAMES["skipped"].inc()
+                return last + (False,)
+        else:
+            gate.reset()  # a face is tracked: every frame votes
+    _GATED_FRAMES["processed"].inc()
+    return _recognize(f, finder, rec, id2name, threshold, allowed_names, roi_size) + (True,)
+
+
+def _recognize(
+    f: np.ndarray,
+    finder: FaceFinder,
+    rec: "cv2.face_LBPHFaceRecognizer",
+    id2name: Dict[int, str],
+    threshold: float,
+    allowed_names: Optional[List[str]],
+    roi_size: Tuple[int, int],
+):
+    """Detect and recognize faces in one frame.
+
+    Returns (boxes, detected_user) where boxes is a list of
+    (x, y, w, h, name, label, conf) and name is None for unaccepted faces.
+    """
+    with STAGE_SECONDS["detect"].time():
+        gray, faces = finder.find(f)
+    boxes = []
+    detected_user = None
+
+    with STAGE_SECONDS["recognize"].time():
+        crops = [cv2.resize(gray[y:y+h, x:x+w], roi_size) for (x, y, w, h) in faces]
+        if hasattr(rec, "predict_batch"):  # LBPHMatcher: all faces in one pass
+            predictions = rec.predict_batch(crops) if crops else []
+        else:
+            predictions = [rec.predict(g) for g in crops]
+
+    for (x, y, w, h), (label, conf) in zip(faces, predictions):
+        name = None
+        if conf <= threshold:
+            candidate = id2name.get(label, "")
+            if not allowed_names or candidate in allowed_names:
+                name = candidate
+                detected_user = name
+        boxes.append((x, y, w, h, name, label, conf))
+
+    return boxes, detected_user
+
+
+class FaceVoter:
+    """Multi-frame (label, confidence) voting per tracked face.
+
+    Each accepted frame (conf <= threshold) adds (threshold - conf) / threshold
+    to its label. A face is accepted once the best label has collected
+    accept_score, appears in at least min_frames votes and wins min_agreement
+    of the recent window, so one lucky frame is not enough. A face whose
+    median confidence stays above threshold * reject_margin for reject_frames
+    frames is reported as UNKNOWN_USER.
+    """
+
+    def __init__(
+        self,
+        id2name: Dict[int, str],
+        *,
+        threshold: float = 70.0,
+        allowed_names: Optional[List[str]] = None,
+        accept_score: float = 1.0,
+        min_frames: int = 3,
+        min_agreement: float = 0.6,
+        reject_frames: int = 8,
+        reject_margin: float = 1.15,
+        window: int = 12,
+        max_missed: int = 5,
+    ):
+        self.id2name = id2name
+        self.threshold = threshold
+        self.allowed_names = allowed_names
+        self.accept_score = accept_score
+        self.min_frames = min_frames
+        self.min_agreement = min_agreement
+        self.reject_frames = reject_frames
+        self.reject_margin = reject_margin
+        self.window = window
+        self.max_missed = max_missed
+        self.tracks: List[dict] = []
+
+    def _match(self, box):
+        x, y, w, h = box
+        cx, cy = x + w / 2, y + h / 2
+        best, best_d = None, None
+        for track in self.tracks:
+            tx, ty, tw, th = track["box"]
+            d = abs(tx + tw / 2 - cx) + abs(ty + th / 2 - cy)
+            if d <= 0.5 * max(tw, th, w, h) and (best_d is None or d < best_d):
+                best, best_d = track, d
+        return best
+
+    def update(self, boxes) -> Optional[str]:
+        """Add one frame of _recognize boxes; returns a name, UNKNOWN_USER or None."""
+        seen = []
+        for (x, y, w, h, _name, label, conf) in boxes:
+            track = self._match((x, y, w, h))
+            if track is None or track in seen:
+                track = {"votes": deque(maxlen=self.window), "missed": 0}
+                self.tracks.append(track)
+            track["box"] = (x, y, w, h)
+            track["votes"].append((label, conf))
+            track["missed"] = 0
+            seen.append(track)
+
+        for track in self.tracks:
+            if track not in seen:
+                track["missed"] += 1
+        self.tracks = [t for t in self.tracks if t["missed"] <= self.max_missed]
+
+        for track in seen:
+            decision = self._decide(track["votes"])
+            if decision is not None:
+                return decision
+        return None
+
+    def _decide(self, votes) -> Optional[str]:
+        n = len(votes)
+        if n < self.min_frames:
+            return None
+
+        scores: Dict[int, float] = {}
+        hits: Dict[int, int] = {}
+        for label, conf in votes:
+            if conf <= self.threshold:
+                scores[label] = scores.get(label, 0.0) + (self.threshold - conf) / self.threshold
+                hits[label] = hits.get(label, 0) + 1
+
+        if scores:
+            label = max(scores, key=scores.get)
+            if (
+                scores[label] >= self.accept_score
+                and hits[label] >= self.min_frames
+                and hits[label] / n >= self.min_agreement
+            ):
+                name = self.id2name.get(label, "")
+                if self.allowed_names and name not in self.allowed_names:
+                    return UNKNOWN_USER
+                return name
+
+        if n >= self.reject_frames:
+            recent = [conf for _, conf in list(votes)[-self.reject_frames:]]
+            median = sorted(recent)[len(recent) // 2]
+            accepted = sum(1 for conf in recent if conf <= self.threshold)
+            if median > self.threshold * self.reject_margin and accepted <= self.reject_frames // 4:
+                return UNKNOWN_USER
+        return None
+
+
+def _decide(detected_user: Optional[str], boxes, voter: Optional[FaceVoter],
+            user_ids: Dict[str, str]):
+    """Map one frame's results to a run_inference return value, or None to keep going."""
+    if voter is None:
+        return user_ids.get(detected_user) if detected_user else None
+    decision = voter.update(boxes)
+    if decision is None or decision == UNKNOWN_USER:
+        return decision
+    return user_ids.get(decision, UNKNOWN_USER)
+
+
+def _make_voter(voting, id2name, threshold, allowed_names, vote_confidence):
+    if not voting:
+        return None
+    return FaceVoter(
+        id2name, threshold=threshold, allowed_names=allowed_names, accept_score=vote_confidence
+    )
+
+
+def _draw_boxes(f: np.ndarray, boxes) -> None:
+    for (x, y, w, h, name, *_) in boxes:
+        if name is None:
+            cv2.rectangle(f, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            continue
+        cv2.rectangle(f, (x, y), (x + w, y + h), (255, 0, 0), 2)
+        cv2.putText(
+            f,
+            name,
+            (x, y - 6),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (255, 255, 255),
+            2,
+        )
 
 
 def run_inference(
     p: Picamera2,
-    det: cv2.CascadeClassifier,
+    det: Union[FaceDetector, cv2.CascadeClassifier],
     rec: "cv2.face_LBPHFaceRecognizer",
     id2name: Dict[int, str],
     *,
     threshold: float = 70.0,
-    allowed_names: Optional[List[str]] = ("user1", "user2"),
+    allowed_names: Optional[List[str]] = None,
+    user_ids: Optional[Dict[str, str]] = None,
     min_face: Tuple[int, int] = (20, 20),
     scale_factor: float = 1.2,
     min_neighbors: int = 5,
     roi_size: Tuple[int, int] = (300, 300),
     window_name: str = "rec",
     timeout: float = 15.0,
+    detect_scale: float = 0.5,
+    redetect_every: int = 10,
+    voting: bool = True,
+    vote_confidence: float = 1.0,
+    motion_gate: bool = True,
+    screen: Optional["Display"] = None,
 ) -> int:
+    """Capture, detect, recognize and show frames on the calling thread until
+    a decision or timeout. With screen (a started Display) frames are handed
+    to its thread instead of being drawn and shown here; ESC is then not read.
+    Returns user_ids[name] for the accepted face (0 on timeout); user_ids
+    defaults to every enrolled name as its own id and allowed_names to all of
+    its names.
+    """
+    finder = FaceFinder(
+        det, min_face=min_face, scale_factor=scale_factor, min_neighbors=min_neighbors,
+        detect_scale=detect_scale, redetect_every=redetect_every,
+    )
+    if user_ids is None:
+        user_ids = enrolled_user_ids(id2name)
+    if allowed_names is None:
+        allowed_names = list(user_ids)
+    voter = _make_voter(voting, id2name, threshold, allowed_names, vote_confidence)
+    gate = MotionGate() if motion_gate else None
     start_time = time.time()
+    decision = 0
+    last = None
     try:
         while True:
-            f = p.capture_array()
-            faces = det.detectMultiScale(f, scale_factor, min_neighbors, minSize=min_face)
-            detected_user = None
-
-            for (x, y, w, h) in faces:
-                cv2.rectangle(f, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                g = cv2.cvtColor(f[y:y+h, x:x+w], cv2.COLOR_RGB2GRAY)
-                g = cv2.resize(g, roi_size)
-                label, conf = rec.predict(g)
-
-                if conf <= threshold:
-                    name = id2name.get(label, "")
-                    if not allowed_names or name in allowed_names:
-                        cv2.rectangle(f, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                        cv2.putText(
-                            f,
-                            name,
-                            (x, y - 6),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.6,
-                            (255, 255, 255),
-                            2,
-                        )
-                        detected_user = name
-
-            cv2.imshow(window_name, f)
-
-            if detected_user == "user1":
-                cv2.waitKey(1500)
-                return "user_A"
-            elif detected_user == "user2":
-                cv2.waitKey(1500)
-                return "user_B"
+            with STAGE_SECONDS["capture"].time():
+                f = p.capture_array()
+            boxes, detected_user, fresh = _recognize_gated(
+                f, gate, last, finder, rec, id2name, threshold, allowed_names, roi_size
+            )
+            last = boxes, detected_user
+            if screen is not None:
+                screen.show(f, boxes)
+            else:
+                with STAGE_SECONDS["display"].time():
+                    _draw_boxes(f, boxes)
+                    cv2.imshow(window_name, f)
+
+            if fresh:  # reused results are not new votes
+                with STAGE_SECONDS["decide"].time():
+                    decision = _decide(detected_user, boxes, voter, user_ids)
+            if decision:
+                if screen is None:
+                    cv2.waitKey(1)
+                return decision
 
             if time.time() - start_time > timeout:
                 return 0
 
-            if cv2.waitKey(1) & 0xFF == 27:
+            if screen is None and cv2.waitKey(1) & 0xFF == 27:
                 return 0
     finally:
-        cv2.destroyAllWindows()
+        if screen is None:
+            cv2.destroyAllWindows()
+        _record_run(time.time() - start_time, decision)
 
 
+def _record_run(elapsed: float, user) -> None:
+    histogram("umbrella_inference_seconds", "Recognition run duration").observe(elapsed)
+    counter("umbrella_inference_runs_total", "Recognition runs",
+            result="match" if user else "none").inc()
+
+
+def _put_drop_oldest(q: "queue.Queue", item) -> None:
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def run_inference_pipelined(
+    p: Picamera2,
+    det: Union[FaceDetector, cv2.CascadeClassifier],
+    rec: "cv2.face_LBPHFaceRecognizer",
+    id2name: Dict[int, str],
+    *,
+    threshold: float = 70.0,
+    allowed_names: Optional[List[str]] = None,
+    user_ids: Optional[Dict[str, str]] = None,
+    min_face: Tuple[int, int] = (20, 20),
+    scale_factor: float = 1.2,
+    min_neighbors: int = 5,
+    roi_size: Tuple[int, int] = (300, 300),
+    window_name: str = "rec",
+    timeout: float = 15.0,
+    detect_scale: float = 0.5,
+    redetect_every: int = 10,
+    voting: bool = True,
+    vote_confidence: float = 1.0,
+    motion_gate: bool = True,
+    queue_size: int = 2,
+    stats: Optional[dict] = None,
+    cancel: Optional[threading.Event] = None,
+    display: bool = True,
+    on_frame: Optional[Callable[[np.ndarray, list], None]] = None,
+) -> int:
+    """Same contract as run_inference, with capture, recognition and display
+    running as separate stages.
+
+    A capture thread feeds a bounded drop-oldest queue, a worker thread runs
+    detection/recognition on the newest frame, and the calling thread only
+    displays the latest annotated frame. If stats is given it is filled with
+    per-stage frame rates and time_to_match. Setting cancel stops early and
+    returns 0. With display=False no HighGUI call is made and annotated
+    frames are handed to on_frame(frame, boxes) instead, so this can run off
+    the GUI thread. With motion_gate, frames that MotionGate finds unchanged
+    while no face is in view reuse the previous (empty) result instead of
+    running the detector again.
+    """
+    finder = FaceFinder(
+        det, min_face=min_face, scale_factor=scale_factor, min_neighbors=min_neighbors,
+        detect_scale=detect_scale, redetect_every=redetect_every,
+    )
+    if user_ids is None:
+        user_ids = enrolled_user_ids(id2name)
+    if allowed_names is None:
+        allowed_names = list(user_ids)
+    voter = _make_voter(voting, id2name, threshold, allowed_names, vote_confidence)
+    gate = MotionGate() if motion_gate else None
+    frames: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    annotated: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    result = {"user": 0, "time_to_match": None}
+    counts = {"captured": 0, "processed": 0, "displayed": 0}
+    start_time = time.monotonic()
+
+    def capture():
+        while not stop.is_set():
+            with STAGE_SECONDS["capture"].time():
+                f = p.capture_array()
+            counts["captured"] += 1
+            _put_drop_oldest(frames, f)
+
+    def recognize():
+        last = None
+        while not stop.is_set():
+            try:
+                f = frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                boxes, detected_user, fresh = _recognize_gated(
+                    f, gate, last, finder, rec, id2name, threshold, allowed_names, roi_size
+                )
+                last = boxes, detected_user
+            except Exception as e:
+                print(f"Recognition error: {e}")
+                stop.set()
+                return
+            counts["processed"] += 1
+            _put_drop_oldest(annotated, (f, boxes))
+            if not fresh:  # reused results are not new votes
+                continue
+            with STAGE_SECONDS["decide"].time():
+                decision = _decide(detected_user, boxes, voter, user_ids)
+            if decision:
+                result["user"] = decision
+                result["time_to_match"] = time.monotonic() - start_time
+                stop.set()
+
+    workers = [
+        threading.Thread(target=capture, name="rec-capture", daemon=True),
+        threading.Thread(target=recognize, name="rec-worker", daemon=True),
+    ]
+    for t in workers:
+        t.start()
+
+    f = None
+    try:
+        while not stop.is_set():
+            if time.monotonic() - start_time > timeout:
+                break
+            if cancel is not None and cancel.is_set():
+                break
+            try:
+                f, boxes = annotated.get(timeout=0.05)
+            except queue.Empty:
+                if display and cv2.waitKey(1) & 0xFF == 27:
+                    break
+                continue
+            if on_frame is not None:
+                on_frame(f, boxes)
+            if not display:
+                counts["displayed"] += 1  # handed to on_frame
+                continue
+            with STAGE_SECONDS["display"].time():
+                _draw_boxes(f, boxes)
+                cv2.imshow(window_name, f)
+            counts["displayed"] += 1
+            if cv2.waitKey(1) & 0xFF == 27:
+                break
+    finally:
+        stop.set()
+        for t in workers:
+            t.join(timeout=1.0)
+
+        # show the deciding frame
+        if result["user"]:
+            try:
+                f, boxes = annotated.get_nowait()
+                if on_frame is not None:
+                    on_frame(f, boxes)
+                if display:
+                    _draw_boxes(f, boxes)
+                    cv2.imshow(window_name, f)
+                    cv2.waitKey(1)
+            except queue.Empty:
+                pass
+        if display:
+            cv2.destroyAllWindows()
+
+        elapsed = max(time.monotonic() - start_time, 1e-9)
+        report = {
+            "capture_fps": counts["captured"] / elapsed,
+            "inference_fps": counts["processed"] / elapsed,
+            "display_fps": counts["displayed"] / elapsed,
+            "time_to_match": result["time_to_match"],
+        }
+        if stats is not None:
+            stats.update(report)
+        _record_run(elapsed, result["user"])
+        ttm = "-" if report["time_to_match"] is None else f"{report['time_to_match']:.2f}s"
+        print(
+            f"capture {report['capture_fps']:.1f} fps, inference {report['inference_fps']:.1f} fps, "
+            f"display {report['display_fps']:.1f} fps, time to match {ttm}"
+        )
+
+    return result["user"]
+
+
+
+class RecognitionJob:
+    """run_inference_pipelined on a worker thread so the controller keeps running.
+
+    The state machine calls start(), then polls done()/result() each loop
+    pass (or gets on_done(result) from the worker thread) and can cancel()
+    it, e.g. when the person walks away. Frames go to screen (a started
+    Display) when given and are dropped otherwise; the job never calls
+    HighGUI itself.
+    """
+
+    def __init__(self, p, det, rec, id2name: Dict[int, str], on_done=None,
+                 screen: Optional["Display"] = None, **kwargs):
+        self._args = (p, det, rec, id2name)
+        self._kwargs = kwargs
+        self._on_done = on_done
+        self._screen = screen
+        self._cancel = threading.Event()
+        self._result = None
+        self._done = threading.Event()
+        self._thread = None
+        self.started_at = None
+
+    def _run(self) -> None:
+        try:
+            self._result = run_inference_pipelined(
+                *self._args, cancel=self._cancel, display=False,
+                on_frame=self._screen.show if self._screen is not None else None, **self._kwargs,
+            )
+        except Exception as e:
+            print(f"Recognition failed: {e}")
+            self._result = 0
+        finally:
+            self._done.set()
+        if self._on_done is not None and not self._cancel.is_set():
+            self._on_done(self._result)
+
+    def start(self) -> "RecognitionJob":
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="recognition", daemon=True)
+        self._thread.start()
+        return self
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self):
+        """user id, UNKNOWN_USER or 0 once done(), else None"""
+        return self._result if self._done.is_set() else None
+
+    def cancel(self, wait: bool = True) -> None:
+        self._cancel.set()
+        if wait and self._thread is not None:
+            self._thread.join(timeout=2.0)
+
 
 def stop_camera(p: Picamera2):
     try:
         p.stop()
     finally:
-        cv2.destroyAllWindows()
+        if DISPLAY:
+            cv2.destroyAllWindows()
+
+_fullscreen_windows = set()
+_blank_frames: Dict[Tuple[int, int], np.ndarray] = {}
+
+
+def _blank_frame(size: Tuple[int, int] = (840, 480)) -> np.ndarray:
+    """Shared read-only black frame of size (w, h)."""
+    blank = _blank_frames.get(size)
+    if blank is None:
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        blank.setflags(write=False)
+        _blank_frames[size] = blank
+    return blank
 
 def set_fullscreen(window_name: str):
+    if not DISPLAY or window_name in _fullscreen_windows:
+        return
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
     cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    _fullscreen_windows.add(window_name)
 
-def show_black_screen(window_name: str = "rec"):
-    black_frame = np.zeros((480, 840, 3), dtype=np.uint8)
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-    cv2.imshow(window_name, black_frame)
-    cv2.waitKey(1)
+
+class Display:
+    """Kiosk screen owned by one thread, decoupled from recognition.
+
+    show(frame, boxes) and blank() only hand over a reference and return;
+    the display thread composes the newest frame into a preallocated
+    canvas (copy, resize if needed, draw boxes), so producers never touch
+    HighGUI and captured frames are not drawn on. The screen is refreshed
+    at most max_fps times per second whatever the inference rate; frames
+    submitted in between are dropped. With UMBRELLA_DISPLAY=0 nothing is
+    drawn and no thread is started.
+    """
+
+    def __init__(self, window_name: str = "rec", size: Tuple[int, int] = (840, 480), max_fps: float = 15.0):
+        self.window_name = window_name
+        self.size = size
+        self.min_interval = 1.0 / max_fps
+        self._canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self._blank = _blank_frame(size)
+        self._pending = None  # (frame, boxes), or None for the blank screen
+        self._dirty = True
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+
+    def start(self) -> "Display":
+        if DISPLAY and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="display", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def show(self, f: np.ndarray, boxes=()) -> None:
+        """Queue a frame (not modified, not copied here) with its _recognize boxes."""
+        with self._cond:
+            self._pending = (f, boxes)
+            self._dirty = True
+            self._cond.notify()
+
+    def blank(self) -> None:
+        with self._cond:
+            self._pending = None
+            self._dirty = True
+            self._cond.notify()
+
+    def _compose(self, item) -> np.ndarray:
+        if item is None:
+            return self._blank
+        f, boxes = item
+        if f.shape[:2] == self._canvas.shape[:2]:
+            np.copyto(self._canvas, f)
+            _draw_boxes(self._canvas, boxes)
+        else:
+            sx, sy = self.size[0] / f.shape[1], self.size[1] / f.shape[0]
+            cv2.resize(f, self.size, dst=self._canvas, interpolation=cv2.INTER_AREA)
+            _draw_boxes(self._canvas, [
+                (int(x * sx), int(y * sy), int(w * sx), int(h * sy), *rest)
+                for (x, y, w, h, *rest) in boxes
+            ])
+        return self._canvas
+
+    def _run(self) -> None:
+        set_fullscreen(self.window_name)
+        next_refresh = 0.0
+        try:
+            while not self._stop.is_set():
+                with self._cond:
+                    # wake for new frames, but keep pumping HighGUI events when idle
+                    if not self._dirty:
+                        self._cond.wait(0.1)
+                    dirty = self._dirty
+                if dirty:
+                    # rate limit; frames arriving meanwhile replace the pending one
+                    delay = next_refresh - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        break
+                    with self._cond:
+                        item, self._dirty = self._pending, False
+                    with STAGE_SECONDS["display"].time():
+                        cv2.imshow(self.window_name, self._compose(item))
+                    self.refreshes += 1
+                    next_refresh = time.monotonic() + self.min_interval
+                cv2.waitKey(1)
+        finally:
+            cv2.destroyWindow(self.window_name)
+            _fullscreen_windows.discard(self.window_name)
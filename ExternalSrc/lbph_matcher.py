@@ -0,0 +1,187 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+def lbp_image(g: np.ndarray, radius: int = 1, neighbors: int = 8) -> np.ndarray:
+    """Extended (circular) LBP codes, same sampling as OpenCV's LBPH elbp."""
+    src = np.asarray(g, dtype=np.float32)
+    rows, cols = src.shape
+    h, w = rows - 2 * radius, cols - 2 * radius
+    center = src[radius:radius + h, radius:radius + w]
+    eps = np.finfo(np.float32).eps
+    dst = np.zeros((h, w), dtype=np.int32)
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        def shifted(dy, dx):
+            return src[radius + dy:radius + dy + h, radius + dx:radius + dx + w]
+
+        if tx == 0 and ty == 0:  # sample point on the pixel grid
+            t = shifted(fy, fx)
+        else:
+            t = (w1 * shifted(fy, fx) + w2 * shifted(fy, cx)
+                 + w3 * shifted(cy, fx) + w4 * shifted(cy, cx))
+        bit = (t > center) | (np.abs(t - center) < eps)
+        dst += bit.astype(np.int32) << n
+    return dst
+
+
+def spatial_histogram(lbp: np.ndarray, num_patterns: int, grid_x: int, grid_y: int) -> np.ndarray:
+    """Per-cell normalized LBP histograms, flattened like OpenCV (row-major cells)."""
+    rows, cols = lbp.shape
+    width, height = cols // grid_x, rows // grid_y
+    cells = lbp[:grid_y * height, :grid_x * width]
+    cell_row = np.arange(grid_y * height) // height
+    cell_col = np.arange(grid_x * width) // width
+    cell_idx = cell_row[:, None] * grid_x + cell_col[None, :]
+    hist = np.bincount(
+        (cell_idx * num_patterns + cells).ravel(),
+        minlength=grid_x * grid_y * num_patterns,
+    ).astype(np.float32)
+    return hist / np.float32(width * height)
+
+
+class LBPHMatcher:
+    """Vectorized LBPH gallery matcher.
+
+    Holds every enrolled histogram in one contiguous (G, D) float32 matrix
+    and computes OpenCV's HISTCMP_CHISQR_ALT distance for a batch of probes.
+    predict() is a drop-in for LBPHFaceRecognizer.predict; with
+    shortlist=None the result is identical to it.
+    """
+
+    def __init__(
+        self,
+        histograms: np.ndarray,
+        labels: np.ndarray,
+        *,
+        radius: int = 1,
+        neighbors: int = 8,
+        grid_x: int = 8,
+        grid_y: int = 8,
+        chunk_size: int = 256,
+        shortlist: int = 256,
+        row_sums: np.ndarray = None,
+        sq_norms: np.ndarray = None,
+    ):
+        self.histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.chunk_size = chunk_size
+        self.shortlist = shortlist
+
+        # precomputed values can be passed in (model cache) to avoid touching
+        # every page of a memory-mapped gallery at startup
+        if row_sums is None:
+            row_sums = self.histograms.sum(axis=1, dtype=np.float64)
+        if sq_norms is None:
+            sq_norms = np.einsum("ij,ij->i", self.histograms, self.histograms)
+        self.row_sums = row_sums
+        self.sq_norms = sq_norms
+
+    @classmethod
+    def from_recognizer(cls, rec, **kwargs) -> "LBPHMatcher":
+        hists = rec.getHistograms()
+        histograms = np.vstack([np.asarray(h, dtype=np.float32).reshape(1, -1) for h in hists])
+        return cls(
+            histograms,
+            np.asarray(rec.getLabels()).ravel(),
+            radius=rec.getRadius(),
+            neighbors=rec.getNeighbors(),
+            grid_x=rec.getGridX(),
+            grid_y=rec.getGridY(),
+            **kwargs,
+        )
+
+    @property
+    def size(self) -> int:
+        return self.histograms.shape[0]
+
+    def features(self, faces: Sequence[np.ndarray]) -> np.ndarray:
+        num_patterns = 2 ** self.neighbors
+        return np.vstack([
+            spatial_histogram(
+                lbp_image(g, self.radius, self.neighbors), num_patterns, self.grid_x, self.grid_y
+            )
+            for g in faces
+        ])
+
+    def _chi_square(self, q: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Exact chi-square distances from one probe to the given gallery rows.
+
+        Bins where the probe is empty contribute exactly the gallery value, so
+        only the probe's non-zero bins are evaluated element-wise and the rest
+        comes from precomputed gallery row sums.
+        """
+        nz = np.flatnonzero(q)
+        qn = q[nz]
+        if rows is None:
+            rows = np.arange(self.size)
+        out = np.empty(len(rows), dtype=np.float64)
+        for start in range(0, len(rows), self.chunk_size):
+            idx = rows[start:start + self.chunk_size]
+            g = self.histograms[idx][:, nz]
+            diff = qn - g
+            partial = (diff * diff / (qn + g)).sum(axis=1, dtype=np.float64)
+            rest = self.row_sums[idx] - g.sum(axis=1, dtype=np.float64)
+            out[start:start + len(idx)] = 2.0 * np.maximum(partial + rest, 0.0)
+        return out
+
+    def distances(self, probes: np.ndarray) -> np.ndarray:
+        """(P, D) probe histograms -> (P, G) exact chi-square distances."""
+        probes = np.asarray(probes, dtype=np.float32)
+        return np.vstack([self._chi_square(q) for q in probes]) if len(probes) else np.empty((0, self.size))
+
+    def _candidates(self, probes: np.ndarray) -> np.ndarray:
+        """(P, shortlist) gallery rows nearest to each probe in L2, one matmul for the batch."""
+        d2 = self.sq_norms[None, :] - 2.0 * (probes @ self.histograms.T)
+        return np.argpartition(d2, self.shortlist - 1, axis=1)[:, :self.shortlist]
+
+    def match(self, faces: Sequence[np.ndarray], k: int = 1) -> List[List[Tuple[int, float]]]:
+        """Top-k (label, distance) per face, best sample per label.
+
+        Large galleries are first narrowed to the shortlist nearest rows by L2
+        distance (a BLAS matmul over the whole batch); chi-square is then exact
+        on those rows only.
+        """
+        if self.size == 0 or len(faces) == 0:
+            return [[] for _ in faces]
+        probes = self.features(faces)
+        use_shortlist = self.shortlist is not None and self.size > self.shortlist
+        candidates = self._candidates(probes) if use_shortlist else None
+
+        results = []
+        for i, q in enumerate(probes):
+            rows = candidates[i] if use_shortlist else np.arange(self.size)
+            dist = self._chi_square(q, rows)
+            best = []
+            seen = set()
+            for j in np.argsort(dist, kind="stable"):
+                label = int(self.labels[rows[j]])
+                if label in seen:
+                    continue
+                seen.add(label)
+                best.append((label, float(dist[j])))
+                if len(best) == k:
+                    break
+            results.append(best)
+        return results
+
+    def predict_batch(self, faces: Sequence[np.ndarray]) -> List[Tuple[int, float]]:
+        return [m[0] if m else (-1, float("inf")) for m in self.match(faces, k=1)]
+
+    def predict(self, face: np.ndarray) -> Tuple[int, float]:
+        return self.predict_batch([face])[0]
@@ -0,0 +1,285 @@
+"""Lightweight in-process metrics and an opt-in sampling profiler.
+
+Counters and histograms live in one process-wide registry and are rendered
+in the Prometheus text exposition format:
+
+    from metrics import counter, histogram
+    counter("umbrella_dht_reads_total", "DHT22 reads", result="ok").inc()
+    with histogram("umbrella_loop_seconds", "Control loop iteration").time():
+        ...
+
+MetricsServer serves /metrics over local HTTP or a Unix socket, plus
+/profile/start, /profile/stop and /profile to drive SamplingProfiler at
+runtime.
+"""
+
+import bisect
+import http.server
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from typing import Dict, Optional, Sequence, Tuple
+
+# seconds; covers a 10 us GPIO read up to a 30 s recognition timeout
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+    __slots__ = ("_hist", "_start")
+
+    def __init__(self, hist: "Histogram"):
+        self._hist = hist
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager observing the elapsed perf_counter time."""
+        return _Timer(self)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, Dict[LabelKey, object]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, object], factory):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        entry = self._metrics.get(name)
+        if entry is not None:
+            child = entry[2].get(key)
+            if child is not None:
+                return child
+        with self._lock:
+            entry = self._metrics.setdefault(name, (kind, help, {}))
+            if entry[0] != kind:
+                raise ValueError(f"metric {name} already registered as a {entry[0]}")
+            return entry[2].setdefault(key, factory())
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self._get("counter", name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted((name, kind, help, dict(children))
+                             for name, (kind, help, children) in self._metrics.items())
+        for name, kind, help, children in metrics:
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(children.items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(key)} {metric.value:g}")
+                    continue
+                with metric._lock:
+                    counts, total, count = list(metric.counts), metric.sum, metric.count
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {total:g}")
+                lines.append(f"{name}_count{_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in key
+    )
+    return "{" + body + "}"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str = "", **labels) -> Counter:
+    return REGISTRY.counter(name, help, **labels)
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS, **labels) -> Histogram:
+    return REGISTRY.histogram(name, help, buckets, **labels)
+
+
+class SamplingProfiler:
+    """Periodically samples every thread's stack; off until start() is called.
+
+    report() returns folded stacks ("thread;outer;inner count"), the input
+    format of flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: "_Tally[str]" = _Tally()
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.samples.clear()
+            self.started_at = time.monotonic()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=1.0)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(str(names.get(ident, ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def report(self, top: Optional[int] = None) -> str:
+        items = self.samples.most_common(top)
+        return "".join(f"{stack} {n}\n" for stack, n in items)
+
+
+PROFILER = SamplingProfiler()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def _reply(self, body: str, status: int = 200,
+               content_type: str = "text/plain; version=0.0.4; charset=utf-8") -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._reply(REGISTRY.render())
+        elif path == "/profile/start":
+            PROFILER.start()
+            self._reply("profiler started\n")
+        elif path == "/profile/stop":
+            PROFILER.stop()
+            self._reply("profiler stopped\n")
+        elif path == "/profile":
+            self._reply(PROFILER.report())
+        else:
+            self._reply("not found\n", status=404)
+
+    def log_message(self, format, *args):
+        pass  # keep the controller's stdout clean
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects (host, port)
+
+
+class MetricsServer:
+    """Serves the registry and profiler on 127.0.0.1:port or a Unix socket.
+
+    address is "port", "host:port" or "unix:/path/to.sock".
+    """
+
+    def __init__(self, address: str = "9108"):
+        self.address = address
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+        if self.address.startswith("unix:"):
+            path = self.address[len("unix:"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = _UnixHTTPServer(path, _Handler)
+        else:
+            host, _, port = self.address.rpartition(":")
+            self._server = http.server.ThreadingHTTPServer((host or "127.0.0.1", int(port)), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self.address.startswith("unix:"):
+            try:
+                os.unlink(self.address[len("unix:"):])
+            except OSError:
+                pass
+        self._server = None
+        PROFILER.stop()
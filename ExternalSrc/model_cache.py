@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from lbph_matcher import LBPHMatcher
+
+CACHE_VERSION = 1
+
+# files inside the cache directory; meta.json is written last and acts as
+# the commit marker, so a half-written cache is never picked up
+HIST_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+ROW_SUMS_FILE = "row_sums.npy"
+SQ_NORMS_FILE = "sq_norms.npy"
+META_FILE = "meta.json"
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_stat(path: str) -> Dict[str, int]:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _atomic_save_npy(path: str, arr: np.ndarray) -> None:
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def _atomic_write_json(path: str, obj) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def build_cache(lbph_path: str, cache_dir: str) -> LBPHMatcher:
+    """Parse the OpenCV YAML model once and write it as memory-mappable .npy files."""
+    rec = cv2.face.LBPHFaceRecognizer_create()
+    rec.read(lbph_path)
+    matcher = LBPHMatcher.from_recognizer(rec)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_save_npy(os.path.join(cache_dir, HIST_FILE), matcher.histograms)
+    _atomic_save_npy(os.path.join(cache_dir, LABELS_FILE), matcher.labels)
+    _atomic_save_npy(os.path.join(cache_dir, ROW_SUMS_FILE), matcher.row_sums)
+    _atomic_save_npy(os.path.join(cache_dir, SQ_NORMS_FILE), matcher.sq_norms)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source_sha256": _file_sha256(lbph_path),
+        "source_stat": _file_stat(lbph_path),
+        "radius": matcher.radius,
+        "neighbors": matcher.neighbors,
+        "grid_x": matcher.grid_x,
+        "grid_y": matcher.grid_y,
+    }
+    _atomic_write_json(os.path.join(cache_dir, META_FILE), meta)
+    return matcher
+
+
+def load_cache(lbph_path: str, cache_dir: str, mmap: bool = True) -> Optional[LBPHMatcher]:
+    """Load the cached gallery if it matches lbph_path, else None.
+
+    The source is re-hashed only when its size or mtime differs from the
+    one recorded at build time.
+    """
+    meta_path = os.path.join(cache_dir, META_FILE)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+
+    stat = _file_stat(lbph_path)
+    if meta.get("source_stat") != stat:
+        if meta.get("source_sha256") != _file_sha256(lbph_path):
+            return None
+        meta["source_stat"] = stat  # same content, new mtime (e.g. copied)
+        _atomic_write_json(meta_path, meta)
+
+    mode = "r" if mmap else None
+    try:
+        arrays = [
+            np.load(os.path.join(cache_dir, name), mmap_mode=mode)
+            for name in (HIST_FILE, LABELS_FILE, ROW_SUMS_FILE, SQ_NORMS_FILE)
+        ]
+    except (OSError, ValueError):
+        return None
+    histograms, labels, row_sums, sq_norms = arrays
+    return LBPHMatcher(
+        histograms,
+        labels,
+        radius=meta["radius"],
+        neighbors=meta["neighbors"],
+        grid_x=meta["grid_x"],
+        grid_y=meta["grid_y"],
+        row_sums=row_sums,
+        sq_norms=sq_norms,
+    )
+
+
+def load_model(lbph_path: str, cache_dir: str = "model_cache") -> Tuple[LBPHMatcher, bool]:
+    """Matcher from the cache, rebuilding it from the YAML when stale.
+
+    Returns (matcher, from_cache).
+    """
+    matcher = load_cache(lbph_path, cache_dir)
+    if matcher is not None:
+        return matcher, True
+    print(f"Building model cache from {lbph_path}...")
+    return build_cache(lbph_path, cache_dir), False
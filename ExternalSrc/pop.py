@@ -1,39 +1,110 @@
+import numpy as np
 import requests
-from datetime import datetime, timedelta
 
-def getPop(lat=37.26, lon=127.05):
+from metrics import counter, histogram
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Open-Meteo hourly times are GMT, so the 12h window is evaluated in UTC
+WINDOW = np.timedelta64(12, "h")
+POP_LEVEL_BINS = np.array([30, 60])  # <30: 1, <60: 2, else 3
 
-    url = (
-        f"https://api.open-meteo.com/v1/forecast?"
-        f"latitude={lat}&longitude={lon}"
-        f"&hourly=precipitation_probability"
-    )
+_fetchSeconds = histogram("umbrella_forecast_fetch_seconds", "Open-Meteo request latency")
+_fetchErrors = counter("umbrella_forecast_fetch_errors_total", "Failed Open-Meteo requests")
 
+
+def _get(params, session, base_url, timeout):
+    http = session if session is not None else requests
     try:
-        data = requests.get(url, timeout=10).json()
-        times = data["hourly"]["time"]
-        pops = data["hourly"]["precipitation_probability"]
+        with _fetchSeconds.time():
+            res = http.get(base_url, params=params, timeout=timeout)
+            res.raise_for_status()
+            return res.json()
+    except Exception:
+        _fetchErrors.inc()
+        raise
+
+
+def fetchForecast(lat=37.26, lon=127.05, session=None, base_url=OPEN_METEO_URL, timeout=10):
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": "precipitation_probability",
+    }
+    return _get(params, session, base_url, timeout)
+
+
+def fetchForecastBatch(coords, session=None, base_url=OPEN_METEO_URL, timeout=10):
+    """One Open-Meteo request for many (lat, lon) pairs, one forecast per pair."""
+    coords = list(coords)
+    if not coords:
+        return []
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
+        "hourly": "precipitation_probability",
+    }
+    data = _get(params, session, base_url, timeout)
+    # a single location comes back as an object, several as a list
+    return data if isinstance(data, list) else [data]
+
+
+def parseHourly(data):
+    hourly = data["hourly"]
+    times = np.array(hourly["time"], dtype="datetime64[m]")
+    pops = np.array(hourly["precipitation_probability"], dtype=np.float64)  # None -> nan
+    return times, pops
+
 
-        now = datetime.utcnow() + timedelta(hours=9)
-        end_time = now + timedelta(hours=12)
+def _windowMask(times, now):
+    if now is None:
+        now = np.datetime64("now", "m")
+    now = np.datetime64(now, "m")
+    return (times >= now) & (times <= now + WINDOW)
 
-        Pop12h = [
-            p for t, p in zip(times, pops)
-            if now <= datetime.fromisoformat(t) + timedelta(hours=9) <= end_time
-        ]
 
-        if not Pop12h:
-            return None
+def _levels(pops, mask):
+    """Rain level per row of pops (2D) for the hours selected by mask."""
+    valid = mask & ~np.isnan(pops)
+    maxPop12h = np.max(np.where(valid, pops, -np.inf), axis=-1)
+    levels = np.digitize(maxPop12h, POP_LEVEL_BINS) + 1
+    return [int(l) if ok else None for l, ok in zip(levels, valid.any(axis=-1))]
 
-        maxPop12h = max(Pop12h)
 
-        if maxPop12h < 30:
-            return 1
-        elif maxPop12h < 60:
-            return 2
-        else:
-            return 3
+def rainLevel(data, now=None):
+    """Rain level 1-3 from the max PoP in the next 12h, None if no data. now is UTC."""
+    times, pops = parseHourly(data)
+    return _levels(pops[np.newaxis, :], _windowMask(times, now)[np.newaxis, :])[0]
 
+
+def rainLevelBatch(forecasts, now=None):
+    if not forecasts:
+        return []
+    parsed = [parseHourly(d) for d in forecasts]
+    times0 = parsed[0][0]
+    if all(t.shape == times0.shape and np.array_equal(t, times0) for t, _ in parsed):
+        # same hourly grid for every location: one 2D pass
+        pops = np.stack([p for _, p in parsed])
+        mask = np.broadcast_to(_windowMask(times0, now), pops.shape)
+        return _levels(pops, mask)
+    return [_levels(p[np.newaxis, :], _windowMask(t, now)[np.newaxis, :])[0] for t, p in parsed]
+
+
+def getPop(lat=37.26, lon=127.05):
+    counter("umbrella_getpop_calls_total", "getPop calls", batch="false").inc()
+    try:
+        return rainLevel(fetchForecast(lat, lon))
     except Exception as e:
         print(f"Error: {e}")
         return None
+
+
+def getPopBatch(coords):
+    """Rain levels for many stands with a single request; None per failed location."""
+    coords = list(coords)
+    counter("umbrella_getpop_calls_total", "getPop calls", batch="true").inc()
+    try:
+        return rainLevelBatch(fetchForecastBatch(coords))
+    except Exception as e:
+        print(f"Error: {e}")
+        return [None] * len(coords)
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pop import OPEN_METEO_URL, fetchForecast, rainLevel
+
+
+class WeatherService:
+    """Open-Meteo forecast cache with TTL, background refresh and disk persistence.
+
+    get_rain_level() never touches the network: it evaluates the 12h window
+    on the cached forecast and, when the cache is older than the TTL, wakes
+    the refresh thread (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        lat: float = 37.26,
+        lon: float = 127.05,
+        *,
+        ttl: float = 1800.0,
+        retry_interval: float = 60.0,
+        cache_path: Optional[str] = "weather_cache.json",
+        base_url: str = OPEN_METEO_URL,
+        timeout: float = 10.0,
+    ):
+        self.lat = lat
+        self.lon = lon
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.cache_path = cache_path
+        self.base_url = base_url
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=1))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=1))
+
+        self._forecast = None
+        self._fetched_at = 0.0  # wall clock, persisted with the forecast
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._load_cache()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="weather", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1.0)
+            self._thread = None
+        self.session.close()
+
+    def age(self) -> Optional[float]:
+        with self._lock:
+            if self._forecast is None:
+                return None
+            return time.time() - self._fetched_at
+
+    def is_stale(self) -> bool:
+        age = self.age()
+        return age is None or age > self.ttl
+
+    def get_rain_level(self, default: int = 0) -> int:
+        with self._lock:
+            forecast = self._forecast
+        if forecast is None or self.is_stale():
+            self._wakeup.set()
+        if forecast is None:
+            return default
+
+        try:
+            level = rainLevel(forecast)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Weather cache error: {e}")
+            return default
+        return default if level is None else level
+
+    def refresh(self) -> bool:
+        try:
+            forecast = fetchForecast(
+                self.lat, self.lon,
+                session=self.session, base_url=self.base_url, timeout=self.timeout,
+            )
+            forecast["hourly"]["time"]  # validate shape before replacing the cache
+        except Exception as e:
+            print(f"Weather refresh failed: {e}")
+            return False
+
+        with self._lock:
+            self._forecast = forecast
+            self._fetched_at = time.time()
+        self._save_cache()
+        return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.is_stale():
+                ok = self.refresh()
+                delay = self.ttl if ok else self.retry_interval
+            else:
+                delay = self.ttl - self.age()
+            self._wakeup.wait(max(delay, 1.0))
+            self._wakeup.clear()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("lat") != self.lat or cached.get("lon") != self.lon:
+                return
+            self._forecast = cached["forecast"]
+            self._fetched_at = float(cached["fetched_at"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring weather cache {self.cache_path}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            payload = {
+                "lat": self.lat,
+                "lon": self.lon,
+                "fetched_at": self._fetched_at,
+                "forecast": self._forecast,
+            }
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Failed to write weather cache: {e}")
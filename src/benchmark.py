@@ -0,0 +1,417 @@
+# benchmark.py
+# 라즈베리 파이에서 직접 실행하는 성능 측정 스크립트
+#   python benchmark.py timing --sensor 1 --pulses 200
+#   python benchmark.py lbph --sizes 100 1000 5000
+#   python benchmark.py startup --lbph lbph.yml --camera
+#   python benchmark.py detector --trace spot_trace.jsonl
+#   python benchmark.py scan --rounds 50
+# 가상 거치대(sim_backend)로 PC에서도 실행 가능
+#   python benchmark.py sim --faces faces --rounds 3
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+
+def _summarize_distances(distances):
+    valid = [d for d in distances if d > 0]
+    summary = {
+        "pulses": len(distances),
+        "timeouts": len(distances) - len(valid),
+    }
+    if valid:
+        summary["mean_cm"] = statistics.fmean(valid)
+        summary["variance_cm2"] = statistics.pvariance(valid)
+    return summary
+
+
+def bench_timing(args):
+    """초음파 에코 측정 방식(poll / edge)별 CPU 사용률과 거리 분산 비교"""
+    import hardware_manager
+
+    trig_pin = hardware_manager.ULTRASONIC_TRIG_PINS[args.sensor]
+    echo_pin = hardware_manager.ULTRASONIC_ECHO_PINS[args.sensor]
+
+    hardware_manager.initialize_hardware()
+    try:
+        for mode in ("poll", "edge"):
+            hardware_manager.set_ultrasonic_timing_mode(mode)
+            distances = []
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            for _ in range(args.pulses):
+                distances.append(hardware_manager._measure_distance(trig_pin, echo_pin))
+                time.sleep(args.interval)
+            cpu_time = time.process_time() - cpu_start
+            wall_time = time.perf_counter() - wall_start
+
+            # 펄스 간 sleep 시간을 빼고 측정 구간의 CPU 점유율 계산
+            busy_wall = max(wall_time - args.pulses * args.interval, 1e-9)
+            summary = _summarize_distances(distances)
+            print(f"[{mode}] {summary}")
+            print(f"[{mode}] cpu {cpu_time:.3f}s / measure wall {busy_wall:.3f}s "
+                  f"({100 * cpu_time / busy_wall:.1f}% of one core)")
+    finally:
+        hardware_manager.cleanup_hardware()
+
+
+def bench_lbph(args):
+    """갤러리 크기별 LBPHMatcher와 OpenCV LBPH predict 지연 시간 비교"""
+    import cv2
+    import numpy as np
+    from lbph_matcher import LBPHMatcher
+
+    rng = np.random.default_rng(0)
+    size = tuple(args.roi)
+
+    def face():
+        noise = rng.integers(0, 256, size, dtype=np.uint8)
+        return cv2.GaussianBlur(noise, (5, 5), 0)
+
+    probes = [face() for _ in range(args.probes)]
+    for gallery_size in args.sizes:
+        images = [face() for _ in range(gallery_size)]
+        labels = np.arange(gallery_size) // args.images_per_user
+
+        rec = cv2.face.LBPHFaceRecognizer_create()
+        rec.train(images, labels)
+        matcher = LBPHMatcher.from_recognizer(rec)
+
+        t = time.perf_counter()
+        expected = [rec.predict(g) for g in probes]
+        stock_ms = (time.perf_counter() - t) * 1000 / len(probes)
+
+        t = time.perf_counter()
+        got = matcher.predict_batch(probes)
+        batch_ms = (time.perf_counter() - t) * 1000 / len(probes)
+
+        agree = sum(e[0] == g[0] for e, g in zip(expected, got))
+        print(f"gallery {gallery_size:6d}: stock predict {stock_ms:8.2f} ms/face, "
+              f"matcher {batch_ms:8.2f} ms/face, same label {agree}/{len(probes)}")
+
+
+def bench_startup(args):
+    """YAML 모델 파싱과 바이너리 캐시 로드, 부팅~인식 준비 시간 비교"""
+    import cv2
+    import model_cache
+
+    t = time.perf_counter()
+    rec = cv2.face.LBPHFaceRecognizer_create()
+    rec.read(args.lbph)
+    print(f"yaml parse      {time.perf_counter() - t:8.3f}s")
+
+    cache_dir = tempfile.mkdtemp(prefix="model_cache_")
+    try:
+        t = time.perf_counter()
+        model_cache.build_cache(args.lbph, cache_dir)
+        print(f"cache build     {time.perf_counter() - t:8.3f}s")
+
+        t = time.perf_counter()
+        matcher = model_cache.load_cache(args.lbph, cache_dir)
+        print(f"cache load      {time.perf_counter() - t:8.3f}s ({matcher.size} histograms)")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if not args.camera:
+        return
+
+    from faceRec import start_camera, stop_camera
+
+    for cache in (None, "model_cache"):
+        t = time.perf_counter()
+        p, det, rec, id2name = start_camera(lbph_path=args.lbph, model_cache_dir=cache)
+        camera_ready = time.perf_counter() - t
+        rec.get()
+        model_ready = time.perf_counter() - t
+        stop_camera(p)
+        label = "yaml " if cache is None else "cache"
+        print(f"boot [{label}] camera ready {camera_ready:.3f}s, recognizer ready {model_ready:.3f}s")
+
+
+def _synthetic_spot_trace(pulses, seed=0):
+    """우산 있음/없음 구간이 번갈아 나오는 측정값 (튐과 측정 실패 포함)"""
+    rng = random.Random(seed)
+    distances = []
+    occupied = False
+    while len(distances) < pulses:
+        for _ in range(rng.randint(20, 80)):
+            r = rng.random()
+            if r < 0.03:
+                distances.append(-1)  # 측정 실패
+            elif r < 0.08:
+                distances.append(rng.uniform(0, 30))  # 튀는 값
+            elif occupied:
+                distances.append(max(rng.gauss(3, 0.7), 0.5))
+            else:
+                distances.append(rng.gauss(20, 4))
+        occupied = not occupied
+    return distances[:pulses]
+
+
+def _load_spot_traces(path):
+    """JSON lines {"spot": 자리 번호, "distance": cm} 또는 sensor_trace 파일 -> {자리 번호: 측정값 목록}"""
+    import sensor_trace
+
+    traces = {}
+    if sensor_trace.is_trace_file(path):
+        _, records = sensor_trace.read_trace(path)
+        for kind, channel, _, value in records:
+            if kind == sensor_trace.KIND_DISTANCE and channel != 0:  # 0: 입구 센서
+                traces.setdefault(channel, []).append(value)
+        return traces
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                traces.setdefault(record["spot"], []).append(record["distance"])
+    return traces
+
+
+def _record_spot_traces(path, pulses, interval):
+    import hardware_manager
+
+    hardware_manager.initialize_hardware()
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(pulses):
+                for spot_id in range(1, len(hardware_manager.ULTRASONIC_TRIG_PINS)):
+                    distance = hardware_manager._measure_distance(
+                        hardware_manager.ULTRASONIC_TRIG_PINS[spot_id],
+                        hardware_manager.ULTRASONIC_ECHO_PINS[spot_id],
+                    )
+                    f.write(json.dumps({"spot": spot_id, "t": time.time(), "distance": distance}) + "\n")
+                time.sleep(interval)
+    finally:
+        hardware_manager.cleanup_hardware()
+
+
+def bench_detector(args):
+    """우산 판정 1회당 펄스 수와 소요 시간: 고정 8회 규칙 vs SPRT"""
+    import spot_detector
+
+    if args.record and not args.trace:
+        raise SystemExit("--record needs --trace")
+    if args.record:
+        _record_spot_traces(args.trace, args.record, args.interval)
+    if args.trace:
+        traces = _load_spot_traces(args.trace)
+    else:
+        traces = {1: _synthetic_spot_trace(args.pulses, seed=1), 2: _synthetic_spot_trace(args.pulses, seed=2)}
+
+    detector = spot_detector.SprtDetector()
+    max_pulses = spot_detector.SPOT_MAX_PULSES
+    for spot_id, distances in sorted(traces.items()):
+        # 기록된 측정값을 처음부터 이어서 소비하며 판정 반복
+        prev_status = False
+        pos = 0
+        used = []
+        agree = 0
+        cpu = 0.0
+        while pos + max_pulses <= len(distances):
+            expected = spot_detector.majority_status(distances[pos:pos + max_pulses], prev_status)
+            t = time.perf_counter()
+            status, pulses = detector.decide((distances[i] for i in range(pos, len(distances))), prev_status)
+            cpu += time.perf_counter() - t
+            agree += status == expected
+            used.append(pulses)
+            pos += pulses
+            prev_status = status
+        if not used:
+            print(f"spot {spot_id}: trace too short")
+            continue
+        mean_pulses = statistics.fmean(used)
+        print(f"spot {spot_id}: {len(used)} decisions, fixed {max_pulses} pulses "
+              f"({max_pulses * args.interval:.2f}s) vs sprt {mean_pulses:.2f} pulses "
+              f"({mean_pulses * args.interval:.2f}s, max {max(used)}), "
+              f"same as fixed rule {agree}/{len(used)}, cpu {cpu * 1e6 / len(used):.1f} us/decision")
+
+
+def bench_scan(args):
+    """전체 초음파 센서 1회 스캔 시간: 순차 트리거 vs 간섭 지도 기반 슬롯 동시 트리거"""
+    import hardware_manager
+    import trigger_scheduler
+
+    sensors = list(range(len(hardware_manager.ULTRASONIC_TRIG_PINS)))
+    plans = {
+        "sequential": trigger_scheduler.plan_slots(sensors, None),
+        "scheduled": trigger_scheduler.plan_slots(sensors, hardware_manager.ULTRASONIC_INTERFERENCE),
+    }
+    hardware_manager.initialize_hardware()
+    try:
+        for name, slots in plans.items():
+            times = []
+            for _ in range(args.rounds):
+                t = time.perf_counter()
+                for slot in slots:
+                    hardware_manager._measure_distances(
+                        [hardware_manager.ULTRASONIC_TRIG_PINS[idx] for idx in slot],
+                        [hardware_manager.ULTRASONIC_ECHO_PINS[idx] for idx in slot],
+                    )
+                times.append(time.perf_counter() - t)
+                time.sleep(args.interval)
+            print(f"[{name}] {len(slots)} slots for {len(sensors)} sensors, full scan "
+                  f"mean {statistics.fmean(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms")
+    finally:
+        hardware_manager.cleanup_hardware()
+
+
+def _period_summary(times, start, end):
+    periods = [b - a for a, b in zip(times, times[1:]) if start <= a and b <= end]
+    if not periods:
+        return "no iterations"
+    periods.sort()
+    return (f"{len(periods)} iterations, mean {statistics.fmean(periods) * 1000:.1f} ms, "
+            f"p95 {periods[int(0.95 * (len(periods) - 1))] * 1000:.1f} ms")
+
+
+def _latency_summary(latencies):
+    done = [t for t in latencies if t is not None]
+    if not done:
+        return f"timed out {len(latencies)}/{len(latencies)}"
+    return (f"mean {statistics.fmean(done):.2f}s, max {max(done):.2f}s, "
+            f"timed out {len(latencies) - len(done)}/{len(latencies)}")
+
+
+def bench_sim(args):
+    """가상 거치대에서 main_loop를 시나리오로 구동: 루프 주기, 사람 도착~자리 LED, 우산 반입~팬 작동 시간"""
+    os.environ["UMBRELLA_BACKEND"] = "sim"
+    os.environ["UMBRELLA_DISPLAY"] = "0"
+    ext_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ExternalSrc")
+    cascade = os.path.join(ext_dir, "haarcascade_frontalface_default.xml")
+    faces_dir = os.path.abspath(args.faces) if args.faces else None
+
+    # 저널, 날씨 캐시, 모델 파일이 실제 거치대 파일과 섞이지 않도록 임시 작업 디렉터리에서 실행
+    work_dir = tempfile.mkdtemp(prefix="umbrella_sim_")
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        shutil.copy(cascade, work_dir)
+        shutil.copy(os.path.join(ext_dir, "labels.json"), work_dir)
+        if faces_dir:
+            import enroll
+            enroll.enroll(faces_dir, cascade_path=cascade, workers=1)
+
+        import main
+        import sensor_sampler
+        import sim_backend
+
+        stand = sim_backend.stand
+        stand.dht_fail_rate = args.dht_fail_rate
+        if faces_dir:
+            stand.load_faces(faces_dir)
+
+        iterations = []
+        phases = {}
+        fan_latency = []
+        led_latency = []
+        stop = threading.Event()
+
+        def scenario():
+            try:
+                while not iterations:  # main_loop 초기화 대기
+                    time.sleep(0.1)
+
+                start = time.monotonic()
+                time.sleep(args.idle)
+                phases["idle"] = (start, time.monotonic())
+
+                start = time.monotonic()
+                for _ in range(args.rounds):
+                    # 젖은 우산으로 습도가 오른 상태, 습도 측정 주기가 지나도록 대기 후 반입
+                    stand.humidity = 60.0
+                    time.sleep(2 * sensor_sampler.HUMIDITY_SAMPLE_PERIOD)
+                    t = time.monotonic()
+                    stand.insert_umbrella(1)
+                    at = stand.wait_for("fan", since=t, timeout=args.timeout)
+                    fan_latency.append(None if at is None else at - t)
+                    stand.humidity = 15.0  # 건조 완료, 팬 정지 대기
+                    stand.remove_umbrella(1)
+                    stand.wait_for("fan", value=False, since=t, timeout=args.timeout)
+                phases["umbrella"] = (start, time.monotonic())
+
+                if not stand.faces:
+                    return
+                visitor = args.visitor or sorted(stand.faces)[0]
+                start = time.monotonic()
+                for _ in range(args.rounds):
+                    t = time.monotonic()
+                    stand.person_arrives(visitor)
+                    at = stand.wait_for("spot_led", since=t, timeout=args.timeout)
+                    led_latency.append(None if at is None else at - t)
+                    stand.person_leaves()
+                    stand.wait_for("spot_led", value=False, since=t, timeout=args.timeout)
+                phases["person"] = (start, time.monotonic())
+            finally:
+                stop.set()
+
+        threading.Thread(target=scenario, name="sim-scenario", daemon=True).start()
+        main.main_loop(stop_event=stop, on_iteration=lambda: iterations.append(time.monotonic()))
+
+        print()
+        for name, (start, end) in phases.items():
+            print(f"loop period [{name}] {_period_summary(iterations, start, end)}")
+        print(f"umbrella insertion -> fan on: {_latency_summary(fan_latency)}")
+        if led_latency:
+            print(f"person arrival -> spot LED:   {_latency_summary(led_latency)}")
+        else:
+            print("person arrival -> spot LED:   skipped (pass --faces faces_dir with user1/, user2/ images)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart Umbrella Stand benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    timing = sub.add_parser("timing", help="ultrasonic echo timing: poll vs edge")
+    timing.add_argument("--sensor", type=int, default=1)
+    timing.add_argument("--pulses", type=int, default=200)
+    timing.add_argument("--interval", type=float, default=0.06)
+    timing.set_defaults(func=bench_timing)
+
+    lbph = sub.add_parser("lbph", help="LBPH matcher latency vs gallery size")
+    lbph.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    lbph.add_argument("--probes", type=int, default=10)
+    lbph.add_argument("--images-per-user", type=int, default=5)
+    lbph.add_argument("--roi", type=int, nargs=2, default=[300, 300])
+    lbph.set_defaults(func=bench_lbph)
+
+    startup = sub.add_parser("startup", help="model load and boot-to-ready time")
+    startup.add_argument("--lbph", default="lbph.yml")
+    startup.add_argument("--camera", action="store_true", help="also time start_camera")
+    startup.set_defaults(func=bench_startup)
+
+    detector = sub.add_parser("detector", help="pulses per umbrella decision: fixed 8 vs SPRT")
+    detector.add_argument("--trace", help="JSON lines or sensor_trace file (default: synthetic)")
+    detector.add_argument("--record", type=int, default=0, help="record this many pulses per spot to --trace first")
+    detector.add_argument("--pulses", type=int, default=5000, help="synthetic trace length per spot")
+    detector.add_argument("--interval", type=float, default=0.2)
+    detector.set_defaults(func=bench_detector)
+
+    scan = sub.add_parser("scan", help="full ultrasonic scan time: sequential vs scheduled slots")
+    scan.add_argument("--rounds", type=int, default=50)
+    scan.add_argument("--interval", type=float, default=0.06)
+    scan.set_defaults(func=bench_scan)
+
+    sim = sub.add_parser("sim", help="main_loop scenarios on the simulated stand")
+    sim.add_argument("--faces", help="faces_dir/<name>/*.jpg used to train and as camera frames")
+    sim.add_argument("--visitor", help="face name shown on arrival (default: first in --faces)")
+    sim.add_argument("--rounds", type=int, default=3)
+    sim.add_argument("--idle", type=float, default=5.0, help="idle phase length (s)")
+    sim.add_argument("--timeout", type=float, default=40.0)
+    sim.add_argument("--dht-fail-rate", type=float, default=0.2)
+    sim.set_defaults(func=bench_sim)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
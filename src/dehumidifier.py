@@ -0,0 +1,130 @@
+# dehumidifier.py
+
+import threading
+import time
+
+import hardware_manager
+import metrics
+
+# 습도 제어 기준 (팬 ON: 20% 초과, 팬 OFF: 17% 미만)
+HUMIDITY_ON_THRESHOLD = 20.0
+HUMIDITY_HYSTERESIS = 3.0
+
+FAN_CHECK_INTERVAL = 5.0   # 팬 구동 중 습도 확인 주기(초)
+FAN_MIN_RUN_TIME = 10.0    # 최소 구동 시간(초)
+FAN_MAX_RUN_TIME = 600.0   # 최대 구동 시간(초), 센서 고장 대비
+FAN_HUMIDITY_RETRIES = 6   # 반입 시 습도값이 없을 때 재확인 횟수
+
+# 습도가 더 이상 내려가지 않으면(기울기 > -0.2%/분) 120초 이후 팬 정지
+FAN_PLATEAU_SLOPE = -0.2
+FAN_PLATEAU_MIN_RUN_TIME = 120.0
+
+_fan_starts = metrics.counter("umbrella_fan_starts_total", "Fan start count")
+_fan_run_seconds = metrics.histogram("umbrella_fan_run_seconds", "Fan run time per start",
+                                     buckets=(10, 30, 60, 120, 180, 300, 450, 600))
+
+
+class FanController:
+    """우산 반입 이벤트를 받아 백그라운드에서 습도 기반으로 팬을 제어"""
+
+    def __init__(
+        self,
+        read_humidity=None,
+        read_trend=None,
+        on_threshold=HUMIDITY_ON_THRESHOLD,
+        hysteresis=HUMIDITY_HYSTERESIS,
+        check_interval=FAN_CHECK_INTERVAL,
+        min_run_time=FAN_MIN_RUN_TIME,
+        max_run_time=FAN_MAX_RUN_TIME,
+    ):
+        self.read_humidity = read_humidity or hardware_manager.get_humidity
+        self.read_trend = read_trend
+        self.on_threshold = on_threshold
+        self.off_threshold = on_threshold - hysteresis
+        self.check_interval = check_interval
+        self.min_run_time = min_run_time
+        self.max_run_time = max_run_time
+
+        self.fan_on = False
+        self.fan_started_at = None
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="fan-controller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=15.0)
+            self._thread = None
+        if self.fan_on:
+            self._set_fan(False)
+
+    def notify_umbrella_inserted(self, spot_id=None):
+        """우산 반입 이벤트 전달 (즉시 반환)"""
+        self._wakeup.set()
+
+    def _set_fan(self, on):
+        if on:
+            hardware_manager.turn_on_fan()
+            self.fan_started_at = time.monotonic()
+            _fan_starts.inc()
+        else:
+            hardware_manager.turn_off_fan()
+            run_time = time.monotonic() - self.fan_started_at
+            _fan_run_seconds.observe(run_time)
+            print(f"팬 작동 종료. ({run_time:.0f}초 구동)")
+            self.fan_started_at = None
+        self.fan_on = on
+
+    def _run(self):
+        pending = 0  # 남은 재확인 횟수
+        while not self._stop_event.is_set():
+            # 팬이 꺼져 있으면 이벤트를 기다리고, 켜져 있으면 주기적으로 습도 확인
+            # 반입 직후 습도값이 없으면 다음 주기에 다시 확인
+            timeout = self.check_interval if (self.fan_on or pending) else None
+            woke = self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            retrying = not woke and pending > 0
+            if retrying:
+                pending -= 1
+            inserted = woke or retrying
+            if self._stop_event.is_set():
+                break
+
+            humidity = self.read_humidity()
+            if not self.fan_on:
+                if not inserted:
+                    continue
+                if humidity is not None:
+                    pending = 0
+                if humidity is not None and humidity > self.on_threshold:
+                    print(f"습도 {humidity:.1f}% 감지. 팬 작동.")
+                    self._set_fan(True)
+                elif humidity is None:
+                    if woke:
+                        print("습도 측정값 없음. 잠시 후 다시 확인합니다.")
+                        pending = FAN_HUMIDITY_RETRIES
+                else:
+                    print(f"습도 {humidity:.1f}%. 팬 작동 안 함.")
+                continue
+
+            run_time = time.monotonic() - self.fan_started_at
+            if run_time >= self.max_run_time:
+                print("최대 구동 시간 초과.")
+                self._set_fan(False)
+            elif run_time >= self.min_run_time and humidity is not None and humidity < self.off_threshold:
+                print(f"습도 {humidity:.1f}%로 하강.")
+                self._set_fan(False)
+            elif run_time >= FAN_PLATEAU_MIN_RUN_TIME and self.read_trend is not None:
+                trend = self.read_trend()
+                if trend is not None and trend > FAN_PLATEAU_SLOPE:
+                    print(f"습도 변화 정체 ({trend:+.2f}%/분).")
+                    self._set_fan(False)
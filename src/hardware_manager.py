@@ -1,28 +1,61 @@
 ﻿# hardware_manager.py
 
-import RPi.GPIO as GPIO
+import os
+import threading
 import time
-import adafruit_dht
-import board
 
-# GPIO Pin 설정
-FAN_PIN = 17
+# 하드웨어 백엔드 선택: "rpi"(기본, 실제 GPIO) 또는 "sim"(sim_backend 가상 거치대)
+HARDWARE_BACKEND = os.environ.get("UMBRELLA_BACKEND", "rpi")
+if HARDWARE_BACKEND == "sim":
+    from sim_backend import GPIO, adafruit_dht, board
+else:
+    import RPi.GPIO as GPIO
+    import adafruit_dht
+    import board
+
+import metrics
+import spot_detector
+import stand_config
+
+# GPIO Pin 설정 (stand_config에서 로드, configure()로 변경 가능)
+FAN_PIN = None
 
 # 날씨 상태 표시 RGB LED 핀
-WEATHER_RGB_RED_PIN = 26
-WEATHER_RGB_GREEN_PIN = 19
-WEATHER_RGB_BLUE_PIN = 13
+WEATHER_RGB_RED_PIN = None
+WEATHER_RGB_GREEN_PIN = None
+WEATHER_RGB_BLUE_PIN = None
 
-# 사용자 우산 위치 표시 LED
-USER_UMBRELLA_SPOT1_PIN = 11
-USER_UMBRELLA_SPOT2_PIN = 14
+# 사용자 우산 위치 표시 LED {자리 번호: 핀}
+SPOT_LED_PINS = {}
 
 # DHT22 습도 센서 핀
-DHT_PIN = board.D4
+DHT_PIN = None
+
+# 초음파 센서 핀 (인덱스 0: 입구, 인덱스 i: 자리 i)
+ULTRASONIC_TRIG_PINS = []
+ULTRASONIC_ECHO_PINS = []
+
+# 초음파 센서 간섭 쌍 (None이면 모든 센서가 서로 간섭)
+ULTRASONIC_INTERFERENCE = None
+
+def configure(config):
+    """설정에서 핀 배치 적용 (initialize_hardware 이전에 호출)"""
+    global FAN_PIN, WEATHER_RGB_RED_PIN, WEATHER_RGB_GREEN_PIN, WEATHER_RGB_BLUE_PIN
+    global SPOT_LED_PINS, DHT_PIN, ULTRASONIC_TRIG_PINS, ULTRASONIC_ECHO_PINS, ULTRASONIC_INTERFERENCE
+
+    FAN_PIN = config["fan_pin"]
+    WEATHER_RGB_RED_PIN, WEATHER_RGB_GREEN_PIN, WEATHER_RGB_BLUE_PIN = config["weather_rgb_pins"]
+    DHT_PIN = getattr(board, config["dht_pin"])
+    spots = config["spots"]
+    SPOT_LED_PINS = {
+        spot_id: spot["led"] for spot_id, spot in enumerate(spots, start=1)
+        if spot.get("led") is not None
+    }
+    ULTRASONIC_TRIG_PINS = [config["entrance"]["trig"]] + [spot["trig"] for spot in spots]
+    ULTRASONIC_ECHO_PINS = [config["entrance"]["echo"]] + [spot["echo"] for spot in spots]
+    ULTRASONIC_INTERFERENCE = config.get("interference")
 
-# 초음파 센서 핀
-ULTRASONIC_TRIG_PINS = [5, 20, 21]
-ULTRASONIC_ECHO_PINS = [6, 23, 24] 
+configure(stand_config.load_config())
 
 # 센서 객체
 dht_sensor = None
@@ -34,6 +67,10 @@ PWM_FREQUENCY = 100
 ULTRASONIC_SOUND_SPEED = 34300
 ULTRASONIC_TIMEOUT = 0.04      
 
+# 초음파 에코 시간 측정 방식 ("poll": 바쁜 대기, "edge": GPIO 엣지 콜백)
+ULTRASONIC_TIMING_MODE = "poll"
+_echo_edge_timers = {}
+
 # 하드웨어 초기화 및 정리
 def _setup_rgb_led_pins(red_pin, green_pin, blue_pin, pwm_dict):
     """날씨용 RGB LED 설정 (공통 애노드 기준)"""
@@ -68,10 +105,9 @@ def initialize_hardware():
     _setup_rgb_led_pins(WEATHER_RGB_RED_PIN, WEATHER_RGB_GREEN_PIN, WEATHER_RGB_BLUE_PIN, weather_rgb_pwm)
    
     # 사용자 우산 위치 표시 LED 설정
-    GPIO.setup(USER_UMBRELLA_SPOT1_PIN, GPIO.OUT)
-    GPIO.setup(USER_UMBRELLA_SPOT2_PIN, GPIO.OUT)
-    GPIO.output(USER_UMBRELLA_SPOT1_PIN, GPIO.LOW)
-    GPIO.output(USER_UMBRELLA_SPOT2_PIN, GPIO.LOW)
+    for led_pin in SPOT_LED_PINS.values():
+        GPIO.setup(led_pin, GPIO.OUT)
+        GPIO.output(led_pin, GPIO.LOW)
 
     # 초음파 센서 핀 설정
     for trig_pin, echo_pin in zip(ULTRASONIC_TRIG_PINS, ULTRASONIC_ECHO_PINS):
@@ -99,11 +135,20 @@ def cleanup_hardware():
     for pwm_obj in weather_rgb_pwm.values():
         pwm_obj.stop()
 
+    # 엣지 콜백 해제
+    if _echo_edge_timers:
+        set_ultrasonic_timing_mode("poll")
+
     GPIO.cleanup()
     print("Hardware cleanup complete.")
 
 #초음파 센서 제어
 def _measure_distance(trig_pin, echo_pin):
+    if ULTRASONIC_TIMING_MODE == "edge":
+        return _measure_distance_edge(trig_pin, echo_pin)
+    return _measure_distance_poll(trig_pin, echo_pin)
+
+def _measure_distance_poll(trig_pin, echo_pin):
     GPIO.output(trig_pin, GPIO.HIGH)
     time.sleep(0.00001)
     GPIO.output(trig_pin, GPIO.LOW)
@@ -127,6 +172,148 @@ def _measure_distance(trig_pin, echo_pin):
     distance = (pulse_duration * ULTRASONIC_SOUND_SPEED) / 2
     return round(distance, 2)
 
+def _pulse_to_distance(pulse_duration):
+    return round((pulse_duration * ULTRASONIC_SOUND_SPEED) / 2, 2)
+
+def _trigger(trig_pins):
+    for trig_pin in trig_pins:
+        GPIO.output(trig_pin, GPIO.HIGH)
+    time.sleep(0.00001)
+    for trig_pin in trig_pins:
+        GPIO.output(trig_pin, GPIO.LOW)
+
+def _measure_distances(trig_pins, echo_pins):
+    """여러 센서를 동시에 트리거하고 에코를 한 번에 측정 (서로 간섭하지 않는 센서만)
+
+    센서 순서대로 거리 목록 반환, 실패한 센서는 -1
+    """
+    if ULTRASONIC_TIMING_MODE == "edge":
+        return _measure_distances_edge(trig_pins, echo_pins)
+    return _measure_distances_poll(trig_pins, echo_pins)
+
+def _measure_distances_poll(trig_pins, echo_pins):
+    _trigger(trig_pins)
+
+    # 센서별 상태: 상승 대기 -> 하강 대기 -> 완료, 한 루프에서 모든 에코 핀 확인
+    start = time.time()
+    rise_times = [None] * len(echo_pins)
+    distances = [None] * len(echo_pins)
+    pending = set(range(len(echo_pins)))
+    while pending:
+        now = time.time()
+        for i in list(pending):
+            level = GPIO.input(echo_pins[i])
+            if rise_times[i] is None:
+                if level == GPIO.HIGH:
+                    rise_times[i] = now
+                elif now - start > ULTRASONIC_TIMEOUT:
+                    distances[i] = -1
+                    pending.discard(i)
+            elif level == GPIO.LOW:
+                distances[i] = _pulse_to_distance(now - rise_times[i])
+                pending.discard(i)
+            elif now - rise_times[i] > ULTRASONIC_TIMEOUT:
+                distances[i] = -1
+                pending.discard(i)
+    return distances
+
+def _measure_distances_edge(trig_pins, echo_pins):
+    timers = [_echo_edge_timers.get(echo_pin) for echo_pin in echo_pins]
+    for timer in timers:
+        if timer is not None:
+            timer.arm()
+    _trigger(trig_pins)
+    for timer in timers:
+        if timer is not None:
+            timer.fire()
+
+    deadline = time.monotonic() + 2 * ULTRASONIC_TIMEOUT
+    distances = []
+    for timer in timers:
+        if timer is None or not timer.done.wait(max(deadline - time.monotonic(), 0)):
+            distances.append(-1)
+            continue
+        pulse_duration = timer.fall_time - timer.rise_time
+        distances.append(-1 if pulse_duration > ULTRASONIC_TIMEOUT else _pulse_to_distance(pulse_duration))
+    return distances
+
+class _EchoEdgeTimer:
+    """에코 핀의 상승/하강 엣지 시각을 콜백으로 기록
+
+    arm()으로 초기화하고 트리거 직후 fire()로 트리거 시각을 남기면, 그 이후의
+    첫 엣지를 상승, 다음 엣지를 하강으로 본다. 콜백이 실행될 때는 짧은 에코가
+    이미 끝나 있을 수 있으므로 핀 레벨은 읽지 않는다.
+    """
+
+    def __init__(self, echo_pin):
+        self.echo_pin = echo_pin
+        self.fired_at = None
+        self.rise_time = None
+        self.fall_time = None
+        self.done = threading.Event()
+
+    def arm(self):
+        self.fired_at = None
+        self.rise_time = None
+        self.fall_time = None
+        self.done.clear()
+
+    def fire(self):
+        self.fired_at = time.monotonic()
+
+    def on_edge(self, channel):
+        now = time.monotonic()
+        # 트리거 전 엣지(이전 에코의 잔여 엣지)는 무시
+        if self.done.is_set() or self.fired_at is None or now < self.fired_at:
+            return
+        if self.rise_time is None:
+            self.rise_time = now
+        else:
+            self.fall_time = now
+            self.done.set()
+
+def _measure_distance_edge(trig_pin, echo_pin):
+    timer = _echo_edge_timers.get(echo_pin)
+    if timer is None:
+        return -1
+
+    timer.arm()
+    GPIO.output(trig_pin, GPIO.HIGH)
+    time.sleep(0.00001)
+    GPIO.output(trig_pin, GPIO.LOW)
+    timer.fire()
+
+    # 상승 대기 + 펄스 폭 각각 ULTRASONIC_TIMEOUT 까지 허용 (폴링 방식과 동일)
+    if not timer.done.wait(2 * ULTRASONIC_TIMEOUT):
+        return -1
+
+    pulse_duration = timer.fall_time - timer.rise_time
+    if pulse_duration > ULTRASONIC_TIMEOUT:
+        return -1
+    distance = (pulse_duration * ULTRASONIC_SOUND_SPEED) / 2
+    return round(distance, 2)
+
+def set_ultrasonic_timing_mode(mode):
+    """초음파 에코 측정 방식 전환 ("poll" 또는 "edge")"""
+    global ULTRASONIC_TIMING_MODE
+    if mode not in ("poll", "edge"):
+        raise ValueError(f"Unknown ultrasonic timing mode: {mode}")
+
+    if mode == "edge":
+        for echo_pin in ULTRASONIC_ECHO_PINS:
+            if echo_pin in _echo_edge_timers:
+                continue
+            timer = _EchoEdgeTimer(echo_pin)
+            GPIO.add_event_detect(echo_pin, GPIO.BOTH, callback=timer.on_edge)
+            _echo_edge_timers[echo_pin] = timer
+    else:
+        for echo_pin in list(_echo_edge_timers):
+            GPIO.remove_event_detect(echo_pin)
+            del _echo_edge_timers[echo_pin]
+
+    ULTRASONIC_TIMING_MODE = mode
+    print(f"Ultrasonic timing mode: {mode}")
+
 def detect_person_ultrasonic(threshold_cm=10):
     """입구쪽 초음파 센서(인덱스 0)로 사람 감지"""
     distance = _measure_distance(ULTRASONIC_TRIG_PINS[0], ULTRASONIC_ECHO_PINS[0])
@@ -134,16 +321,49 @@ def detect_person_ultrasonic(threshold_cm=10):
     return 0 < distance <= threshold_cm
 
 # 습도 센서 제어
+# DHT22 측정 지표
+_dht_read_seconds = metrics.histogram("umbrella_dht_read_seconds", "DHT22 read latency")
+_dht_reads = {
+    result: metrics.counter("umbrella_dht_reads_total", "DHT22 reads", result=result)
+    for result in ("ok", "invalid", "error")
+}
+_dht_retries = metrics.counter("umbrella_dht_retries_total", "DHT22 retries in get_humidity")
+
+def _read_dht():
+    """DHT22 1회 측정, (습도 또는 None, 오류)"""
+    with _dht_read_seconds.time():
+        try:
+            humidity = dht_sensor.humidity
+        except Exception as e:
+            _dht_reads["error"].inc()
+            return None, e
+    if humidity is not None and 0 <= humidity <= 100:
+        _dht_reads["ok"].inc()
+        return humidity, None
+    _dht_reads["invalid"].inc()
+    return None, None
+
+def read_humidity_once():
+    """DHT22 1회 측정 (재시도 없음), 실패 시 None"""
+    if dht_sensor is None:
+        return None
+    humidity, error = _read_dht()
+    if error is not None:
+        print(f"DHT22 Sensor Error: {error}")
+    return humidity
+
 def get_humidity():
     max_retries = 5
     for attempt in range(max_retries):
-        try:
-            humidity = dht_sensor.humidity
-            if humidity is not None and 0 <= humidity <= 100:
-                return humidity
+        if attempt:
+            _dht_retries.inc()
+        humidity, error = _read_dht()
+        if humidity is not None:
+            return humidity
+        if error is not None:
+            print(f"DHT22 Sensor Error: {error}")
+        else:
             print(f"Failed to read humidity (Attempt {attempt + 1}/{max_retries})...")
-        except Exception as e:
-            print(f"DHT22 Sensor Error: {e}")
         time.sleep(2.0) 
     return None
 
@@ -171,41 +391,36 @@ def set_weather_led_color(rain_level):
 
 def highlight_user_umbrella_spot(user_id, spot_id, turn_on=True):
     state = GPIO.HIGH if turn_on else GPIO.LOW
-    
-    if spot_id == 1:
-        GPIO.output(USER_UMBRELLA_SPOT1_PIN, state)
-        print(f"Spot 1 LED {'ON' if turn_on else 'OFF'} for user {user_id}")
-    elif spot_id == 2:
-        GPIO.output(USER_UMBRELLA_SPOT2_PIN, state)
-        print(f"Spot 2 LED {'ON' if turn_on else 'OFF'} for user {user_id}")
+    led_pin = SPOT_LED_PINS.get(spot_id)
+    if led_pin is not None:
+        GPIO.output(led_pin, state)
+        print(f"Spot {spot_id} LED {'ON' if turn_on else 'OFF'} for user {user_id}")
+
+def turn_off_spot_leds():
+    for led_pin in SPOT_LED_PINS.values():
+        GPIO.output(led_pin, GPIO.LOW)
 
 def reset_leds():
     _set_rgb_color(weather_rgb_pwm, 0, 0, 0)
-    GPIO.output(USER_UMBRELLA_SPOT1_PIN, GPIO.LOW)
-    GPIO.output(USER_UMBRELLA_SPOT2_PIN, GPIO.LOW)
+    turn_off_spot_leds()
     print("All LEDs (Weather & Spots) reset to OFF.")
 
 # 특정 자리의 우산 유무 확인
+SPOT_PULSE_INTERVAL = 0.2
+_spot_detector = spot_detector.SprtDetector()
+
+def _spot_pulses(trig_pin, echo_pin):
+    """필요할 때마다 펄스를 1회씩 발사하는 측정 제너레이터"""
+    while True:
+        yield _measure_distance(trig_pin, echo_pin)
+        time.sleep(SPOT_PULSE_INTERVAL)
+
 def get_spot_umbrella_status(spot_id, prev_status):
-    if not (1 <= spot_id <= 2):
+    """SPRT로 판정이 확실해지는 즉시 측정 중단 (최대 8회, 히스테리시스 임계값 5/8cm 유지)"""
+    if not (1 <= spot_id < len(ULTRASONIC_TRIG_PINS)):
         return False
 
     trig_pin = ULTRASONIC_TRIG_PINS[spot_id]
     echo_pin = ULTRASONIC_ECHO_PINS[spot_id]
-    threshold = 8 if prev_status else 5
-    detected = 0;
-    for i in range (8):
-        distance = _measure_distance(trig_pin, echo_pin)
-        time.sleep(0.2) 
-        if distance < 0:
-            #print(spot_id, distance)
-            continue
-        if (distance <threshold):
-            detected += 1
-            #print(spot_id, distance)
-    
-    # 히스테리시스 적용
-    if (5 <detected):
-        return True
-    else:
-        return False
+    status, _ = _spot_detector.decide(_spot_pulses(trig_pin, echo_pin), prev_status)
+    return status
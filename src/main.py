@@ -1,164 +1,324 @@
-﻿import time
-from faceRec import start_camera, run_inference, stop_camera, show_black_screen
-from pop import getPop
+﻿import os
+import queue
+import time
+from faceRec import start_camera, stop_camera, Display, ModelReloader, RecognitionJob
+from weather import WeatherService
 
 import hardware_manager
 import umbrella_storage
+import sensor_sampler
+import dehumidifier
+import state_journal
+import sensor_trace
+import metrics
+import presence_detector
+import stand_config
 
-# 우산 보관함 초기화
-umbrella_box = umbrella_storage.UmbrellaStorage()
+# 우산 보관함 초기화 (저널에서 마지막 상태 복원)
+umbrella_box = umbrella_storage.UmbrellaStorage(journal=state_journal.StateJournal())
 
 # 시스템 상태 정의
 STATE_IDLE = "IDLE"
 STATE_PERSON_DETECTED = "PERSON_DETECTED"
 STATE_USER_RECOGNIZED = "USER_RECOGNIZED"
-STATE_UMBRELLA_ACTIVITY = "UMBRELLA_ACTIVITY"
 
-current_system_state = STATE_IDLE
-last_detected_user = None 
-last_weather_rain_level = 0 
+# 이벤트 정의
+EVENT_PERSON_ARRIVED = "PERSON_ARRIVED"
+EVENT_PERSON_LEFT = "PERSON_LEFT"
+EVENT_RECOGNITION_DONE = "RECOGNITION_DONE"
+EVENT_UMBRELLA_INSERTED = "UMBRELLA_INSERTED"
+EVENT_UMBRELLA_REMOVED = "UMBRELLA_REMOVED"
 
 window_name = "rec"
 
-# 사용자-자리 매핑
-USER_SPOT_MAPPING = {
-    "user_A": 1,
-    "user_B": 2
-}
-SPOT_USER_MAPPING = {
-    1: "user_A",
-    2: "user_B"
-}
+_tick_seconds = metrics.histogram("umbrella_tick_seconds", "Controller periodic work per loop pass")
 
-NO_PERSON_THRESHOLD = 2  
-no_person_count = 0      
+# 루프 주기(초): 사람이 있으면 빠르게, 대기 상태에서는 느리게 (입구 센서 이벤트로 즉시 깨어남)
+ACTIVE_POLL_PERIOD = 0.05
+IDLE_POLL_PERIOD = 1.0
 
 def turn_off_all_user_spots():
-    hardware_manager.highlight_user_umbrella_spot(None, 1, turn_on=False)
-    hardware_manager.highlight_user_umbrella_spot(None, 2, turn_on=False)
+    hardware_manager.turn_off_spot_leds()
 
-def main_loop():
-    global current_system_state, last_detected_user, last_weather_rain_level
 
+class StandController:
+    """이벤트 큐와 전이 테이블 기반 상태 머신"""
+
+    # (현재 상태, 이벤트) -> 처리 함수 이름, 상태가 None이면 모든 상태에서 처리
+    # 처리 함수는 새 상태를 반환 (None이면 상태 유지)
+    TRANSITIONS = {
+        (STATE_IDLE, EVENT_PERSON_ARRIVED): "_on_person_arrived",
+        (STATE_PERSON_DETECTED, EVENT_RECOGNITION_DONE): "_on_recognition_done",
+        (STATE_PERSON_DETECTED, EVENT_PERSON_LEFT): "_on_person_left",
+        (STATE_USER_RECOGNIZED, EVENT_PERSON_LEFT): "_on_person_left",
+        (None, EVENT_UMBRELLA_INSERTED): "_on_umbrella_inserted",
+        (None, EVENT_UMBRELLA_REMOVED): "_on_umbrella_removed",
+    }
+
+    def __init__(self, sampler, fan_controller, weather, p, det, face_model, screen, trace=None):
+        self.sampler = sampler
+        self.fan_controller = fan_controller
+        self.weather = weather
+        self.p = p
+        self.det = det
+        self.face_model = face_model
+        self.screen = screen # faceRec.Display, 화면 갱신은 별도 스레드에서 수행
+        self.trace = trace # sensor_trace.TraceWriter (선택)
+
+        self.state = STATE_IDLE
+        self.events = queue.Queue()
+        self.last_detected_user = None
+        self.last_weather_rain_level = 0
+        self.presence = presence_detector.PresenceDetector() # 입구 센서 사람 감지/이탈 판정
+        self.recognition_job = None # 진행 중인 비동기 안면 인식 작업
+        self.recognition_retry_at = 0 # 인식 종료 후 재시도 대기 시각
+
+        # 입구 센서 측정마다 호출, 사람이 다가오면 대기 중인 루프를 바로 깨움
+        sampler.add_listener(sensor_sampler.ENTRANCE_SENSOR_INDEX, self._on_entrance_reading)
+        self._apply_duty_cycle()
+
+    def post(self, event, payload=None):
+        """이벤트 등록 (센서/인식 스레드에서 호출)"""
+        self.events.put((event, payload))
+
+    def _on_entrance_reading(self, idx, timestamp, distance):
+        if self.presence.on_reading(distance):
+            self.post(EVENT_PERSON_ARRIVED)
+
+    def poll_period(self):
+        if self.state == STATE_IDLE and self.recognition_job is None:
+            return IDLE_POLL_PERIOD
+        return ACTIVE_POLL_PERIOD
+
+    def _apply_duty_cycle(self):
+        """대기 상태에서는 우산 자리 센서 측정 주기를 늘림"""
+        if self.state == STATE_IDLE:
+            period = sensor_sampler.SPOT_IDLE_SAMPLE_PERIOD
+        else:
+            period = sensor_sampler.SPOT_SAMPLE_PERIOD
+        for spot_id in range(1, umbrella_box.num_spots + 1):
+            self.sampler.set_period(spot_id, period)
+
+    def dispatch(self, event, payload=None):
+        handler = self.TRANSITIONS.get((self.state, event)) or self.TRANSITIONS.get((None, event))
+        if handler is None:
+            return # 현재 상태에서 무시하는 이벤트
+        with metrics.histogram("umbrella_event_seconds", "Event handler latency", event=event).time():
+            new_state = getattr(self, handler)(payload)
+        if new_state is not None and new_state != self.state:
+            metrics.counter("umbrella_state_transitions_total", "Controller state transitions",
+                            **{"from": self.state, "to": new_state}).inc()
+            self.state = new_state
+            self._apply_duty_cycle()
+
+    def run_once(self):
+        """이벤트를 기다렸다가 쌓인 이벤트를 모두 처리한 뒤 주기 작업 수행"""
+        try:
+            event, payload = self.events.get(timeout=self.poll_period())
+            while True:
+                self.dispatch(event, payload)
+                event, payload = self.events.get_nowait()
+        except queue.Empty:
+            pass
+        with _tick_seconds.time():
+            self.tick()
+
+    def tick(self):
+        now = time.monotonic()
+
+        # 1. 사람 감지 (초음파 센서)
+        presence = self.presence.check(
+            now, self.sampler.latest(sensor_sampler.ENTRANCE_SENSOR_INDEX), self.state != STATE_IDLE)
+        if presence == presence_detector.ARRIVED and now >= self.recognition_retry_at:
+            self.post(EVENT_PERSON_ARRIVED)
+        elif presence == presence_detector.LEFT: # 사람이 감지되지 않은 상태가 이어짐
+            self.post(EVENT_PERSON_LEFT)
+
+        # 2. 우산 유무 확인 (항상 확인), 측정 상태를 비트셋으로 모아 변화한 자리만 처리
+        observed_bits = 0
+        for spot_id in range(1, umbrella_box.num_spots + 1):
+            if self.sampler.spot_umbrella_status(spot_id, umbrella_box.get_spot_status(spot_id)):
+                observed_bits |= 1 << spot_id
+        for spot_id in umbrella_box.changed_spots(observed_bits):
+            new_status = bool(observed_bits >> spot_id & 1)
+            self.post(EVENT_UMBRELLA_INSERTED if new_status else EVENT_UMBRELLA_REMOVED, spot_id)
+
+        # 재시작 후 복원된 자리는 센서 측정이 충분히 쌓이면 확인 처리 (다르면 위에서 이벤트 발생)
+        for spot_id in umbrella_box.restored_spots():
+            if self.sampler.is_ready(spot_id) and observed_bits >> spot_id & 1:
+                umbrella_box.confirm_spot(spot_id)
+                print(f"자리 {spot_id}: 복원된 우산 보관 상태 확인됨.")
+
+    def _on_person_arrived(self, payload):
+        if time.monotonic() < self.recognition_retry_at:
+            return None
+        print("사람 감지됨. 사용자 인식 시도.")
+        self.presence.reset()
+
+        # 캐시된 날씨 정보로 LED 설정 (네트워크 대기 없음)
+        self.last_weather_rain_level = self.weather.get_rain_level(default=0)
+        hardware_manager.set_weather_led_color(self.last_weather_rain_level)
+
+        # 안면 인식 작업 시작 (백그라운드), 끝나면 이벤트로 결과 전달
+        rec, id2name, user_ids = self.face_model.current()
+        # 결과에 작업을 함께 실어 취소된 이전 작업의 늦은 결과를 구분
+        job = RecognitionJob(
+            self.p, self.det, rec, id2name, timeout=30, screen=self.screen,
+            user_ids=user_ids, allowed_names=list(user_ids),
+            on_done=lambda user_id: self.post(EVENT_RECOGNITION_DONE, (job, user_id)),
+        )
+        self.recognition_job = job.start()
+        return STATE_PERSON_DETECTED
+
+    def _on_recognition_done(self, payload):
+        job, user_id = payload
+        if job is not self.recognition_job:
+            return None # 취소된 이전 작업의 결과
+        self.recognition_job = None
+        if self.trace is not None:
+            now = time.monotonic()
+            self.trace.recognition(now, user_id or None, now - job.started_at)
+        self.screen.blank()
+        print("Detected User:", user_id)
+
+        if not user_id:
+            print("사용자 인식 실패. IDLE 상태로 복귀.")
+            turn_off_all_user_spots()
+            self.recognition_retry_at = time.monotonic() + 1
+            return STATE_IDLE
+
+        if not umbrella_box.is_registered_user(user_id): # 등록되지 않은 사용자
+            print(f"미등록 사용자 감지. 무시합니다.")
+            turn_off_all_user_spots()
+            self.recognition_retry_at = time.monotonic() + 2
+            return STATE_IDLE
+
+        self.last_detected_user = user_id
+        print(f"사용자 '{user_id}' 인식됨.")
+
+        # 인식된 사용자의 고정된 우산 위치 LED 점등
+        user_assigned_spot = umbrella_box.get_user_umbrella_spot(user_id)
+        if user_assigned_spot is not None:
+            hardware_manager.highlight_user_umbrella_spot(user_id, user_assigned_spot, turn_on=True)
+            print(f"사용자 '{user_id}'의 우산 위치 점등: 자리 {user_assigned_spot}")
+        else:
+            print(f"경고: 사용자 '{user_id}'에 할당된 고정 자리가 없습니다.")
+            turn_off_all_user_spots()
+        return STATE_USER_RECOGNIZED
+
+    def _on_person_left(self, payload):
+        print("사람이 사라짐. 시스템 리셋.")
+        if self.recognition_job is not None: # 진행 중인 인식 취소
+            self.recognition_job.cancel(wait=False) # 종료를 기다리지 않음 (제어 루프 정지 방지)
+            self.recognition_job = None
+            self.screen.blank()
+        hardware_manager.reset_leds()
+        self.last_detected_user = None
+        self.presence.reset()
+        return STATE_IDLE
+
+    def _on_umbrella_inserted(self, spot_id):
+        if umbrella_box.get_spot_status(spot_id):
+            return None # 이미 반영된 변화
+        print(f"자리 {spot_id}에 우산이 새로 들어옴.")
+
+        # 보관 사용자는 직전에 인식된 사용자 (인식 없이 넣은 경우 None)
+        holder = self.last_detected_user
+        umbrella_box.update_spot_status(spot_id, True, holder)
+        assigned_user_for_spot = umbrella_box.get_spot_user(spot_id)
+        if holder:
+            print(f"-> 자리 {spot_id}에 사용자 '{holder}'의 우산 보관.")
+        elif assigned_user_for_spot:
+            print(f"-> 자리 {spot_id}: 인식된 사용자 없이 우산이 들어옴 (배정 사용자 '{assigned_user_for_spot}').")
+        else:
+            print(f"경고: 자리 {spot_id}에 할당된 사용자가 없습니다.")
+
+        # 습도 확인 후 팬 작동 (백그라운드)
+        self.fan_controller.notify_umbrella_inserted(spot_id)
+
+        self.last_detected_user = None
+        self.presence.reset()
+        return None
+
+    def _on_umbrella_removed(self, spot_id):
+        if not umbrella_box.get_spot_status(spot_id):
+            return None # 이미 반영된 변화
+        print(f"자리 {spot_id}에서 우산이 가져가짐.")
+        umbrella_box.update_spot_status(spot_id, False, None)
+
+        self.last_detected_user = None
+        self.presence.reset()
+        return None
+
+    def shutdown(self):
+        if self.recognition_job is not None:
+            self.recognition_job.cancel(wait=False) # 작업 스레드는 취소를 확인하고 스스로 종료
+            self.recognition_job = None
+
+
+def main_loop(stop_event=None, on_iteration=None):
+    """stop_event가 설정되거나 Ctrl+C까지 실행, on_iteration은 루프 1회마다 호출 (벤치마크용)"""
     hardware_manager.initialize_hardware() # 하드웨어 초기화
     hardware_manager.reset_leds() # 모든 LED 초기 상태로
+    sampler = sensor_sampler.UltrasonicSampler() # 초음파 센서 백그라운드 측정
+    humidity_sampler = sensor_sampler.HumiditySampler() # DHT22 백그라운드 측정
+    trace = None
+    trace_dir = os.environ.get("UMBRELLA_TRACE") # 센서 트레이스 기록 디렉터리 (선택)
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+        trace = sensor_trace.TraceWriter(os.path.join(trace_dir, time.strftime("trace_%Y%m%d_%H%M%S.umbt")))
+        for idx in sampler.periods:
+            sampler.add_listener(idx, trace.distance)
+        humidity_sampler.add_listener(trace.humidity)
+        print(f"센서 트레이스 기록: {trace.path}")
+    metrics_server = None
+    metrics_address = os.environ.get("UMBRELLA_METRICS") # 지표 엔드포인트: 포트 또는 unix:/경로 (선택)
+    if metrics_address:
+        metrics_server = metrics.MetricsServer(metrics_address)
+        metrics_server.start()
+        print(f"지표 엔드포인트: {metrics_address} (/metrics, /profile/start, /profile/stop, /profile)")
+    sampler.start()
+    humidity_sampler.start()
+    fan_controller = dehumidifier.FanController( # 습도 기반 팬 백그라운드 제어
+        read_humidity=humidity_sampler.get_humidity,
+        read_trend=humidity_sampler.trend,
+    )
+    fan_controller.start()
+    weather = WeatherService(lat=37.26, lon=127.05) # 날씨 예보 캐시 및 백그라운드 갱신
+    weather.start()
     p, det, rec, id2name = start_camera()
+    face_model = ModelReloader( # 사용자 등록 시 모델 자동 갱신
+        rec, id2name, user_ids=stand_config.face_users(stand_config.load_config()))
     print("Camera initialized")
+    restored = umbrella_box.restored_spots()
+    if restored:
+        print(f"저장된 상태 복원: 자리 {restored} (센서로 확인 중)")
     print("시스템 시작. IDLE 상태.")
-    show_black_screen(window_name)
+    screen = Display(window_name).start() # 인식 화면 (별도 스레드, 초당 최대 15회 갱신)
+
+    controller = StandController(sampler, fan_controller, weather, p, det, face_model, screen, trace)
 
     try:
-        while True:
-            # 1. 사람 감지 (초음파 센서)
-            if hardware_manager.detect_person_ultrasonic(threshold_cm=10):
-                no_person_count = 0 
-                if current_system_state == STATE_IDLE:
-                    current_system_state = STATE_PERSON_DETECTED
-                    print("사람 감지됨. 사용자 인식 시도.")
-                    
-                    # 날씨 정보 가져와서 LED 설정
-                    try:
-                        last_weather_rain_level = getPop(lat=37.26, lon=127.05)
-                    except Exception as e:
-                        print(f"날씨 정보 가져오기 실패: {e}")
-                        last_weather_rain_level = 0
-                        
-                    hardware_manager.set_weather_led_color(last_weather_rain_level)
-                    
-                # 2. 사용자 인식 (사람 감지 상태에서만)
-                if current_system_state == STATE_PERSON_DETECTED:
-                    user_id = run_inference(p, det, rec, id2name, timeout=30)
-                    show_black_screen(window_name)
-                    print("Detected User:", user_id)
-                    
-                    if user_id:
-                        if user_id not in USER_SPOT_MAPPING: # 등록되지 않은 사용자
-                            print(f"미등록 사용자 감지. 무시합니다.")
-                            turn_off_all_user_spots()
-                            current_system_state = STATE_IDLE
-                            time.sleep(2) 
-                            continue
-
-                        last_detected_user = user_id
-                        current_system_state = STATE_USER_RECOGNIZED
-                        print(f"사용자 '{user_id}' 인식됨.")
-                        
-                        # 인식된 사용자의 고정된 우산 위치 LED 점등
-                        user_assigned_spot = umbrella_box.get_user_umbrella_spot(user_id)
-                        
-                        if user_assigned_spot is not None:
-                            hardware_manager.highlight_user_umbrella_spot(user_id, user_assigned_spot, turn_on=True)
-                            print(f"사용자 '{user_id}'의 우산 위치 점등: 자리 {user_assigned_spot}")
-                        else:
-                            print(f"경고: 사용자 '{user_id}'에 할당된 고정 자리가 없습니다.")
-                            turn_off_all_user_spots()
-
-                    else:
-                        print("사용자 인식 실패. IDLE 상태로 복귀.")
-                        turn_off_all_user_spots()
-                        current_system_state = STATE_IDLE 
-                        time.sleep(1) 
-                        continue
-
-            else: # 사람이 감지되지 않음
-                if current_system_state != STATE_IDLE:
-                    no_person_count += 1
-                    if no_person_count >= NO_PERSON_THRESHOLD:
-                        print("사람이 사라짐. 시스템 리셋.")
-                        hardware_manager.reset_leds()
-                        last_detected_user = None
-                        current_system_state = STATE_IDLE
-                        no_person_count = 0 
-                
-            # 3. 우산 유무 확인 및 처리 (항상 확인)
-            for spot_id in range(1, umbrella_box.num_spots + 1): 
-                new_umbrella_status = hardware_manager.get_spot_umbrella_status(spot_id, umbrella_box.get_spot_status(spot_id))
-
-                # 우산 상태 변화 감지
-                if umbrella_box.get_spot_status(spot_id) != new_umbrella_status:
-                    if(current_system_state == STATE_IDLE):
-                        current_system_state = STATE_UMBRELLA_ACTIVITY
-                    
-                    if new_umbrella_status: # 우산이 새로 생김
-                        print(f"자리 {spot_id}에 우산이 새로 들어옴.")
-                        
-                        assigned_user_for_spot = SPOT_USER_MAPPING.get(spot_id)
-                        if assigned_user_for_spot:
-                            umbrella_box.update_spot_status(spot_id, True, assigned_user_for_spot)
-                            print(f"-> 자리 {spot_id}는 사용자 '{assigned_user_for_spot}'의 우산으로 할당.")
-                        else:
-                            print(f"경고: 자리 {spot_id}에 할당된 사용자가 없습니다.")
-
-                        # 습도 확인 후 팬 작동
-                        current_humidity = hardware_manager.get_humidity()
-                        if current_humidity is not None and current_humidity > 20: 
-                            print(f"습도 {current_humidity:.1f}% 감지. 팬 작동.")
-                            hardware_manager.turn_on_fan()
-                            time.sleep(10) 
-                            hardware_manager.turn_off_fan()
-                            print("팬 작동 종료.")
-                        else:
-                            print(f"습도 {current_humidity:.1f}%. 팬 작동 안 함.")
-                        
-                        last_detected_user = None
-                        no_person_count = 0
-                        if(current_system_state == STATE_UMBRELLA_ACTIVITY):
-                            current_system_state = STATE_IDLE 
-
-                    else: # 우산이 사라짐
-                        print(f"자리 {spot_id}에서 우산이 가져가짐.")
-                        umbrella_box.update_spot_status(spot_id, False, None) 
-                        
-                        last_detected_user = None
-                        no_person_count = 0 
-                        if(current_system_state == STATE_UMBRELLA_ACTIVITY):
-                            current_system_state = STATE_IDLE 
-                
-            time.sleep(0.5) 
-            
+        while stop_event is None or not stop_event.is_set():
+            controller.run_once()
+            if on_iteration is not None:
+                on_iteration()
+
     except KeyboardInterrupt:
         print("프로그램 종료 요청.")
     finally:
+        controller.shutdown()
+        screen.stop()
+        sampler.stop()
+        fan_controller.stop()
+        humidity_sampler.stop()
+        weather.stop()
+        if umbrella_box.journal is not None:
+            umbrella_box.journal.close()
+        if trace is not None:
+            trace.close()
+        if metrics_server is not None:
+            metrics_server.stop()
         hardware_manager.cleanup_hardware()
         print("하드웨어 정리 완료. 프로그램 종료.")
 
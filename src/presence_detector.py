@@ -0,0 +1,66 @@
+# presence_detector.py
+# 입구 센서 기반 사람 감지/이탈 판정 (main.py와 trace_replay.py가 함께 사용, 하드웨어 의존 없음)
+
+PERSON_DISTANCE_CM = 10
+NO_PERSON_THRESHOLD = 2
+PRESENCE_CHECK_INTERVAL = 0.5  # 사람 감지 확인 주기(초), NO_PERSON_THRESHOLD는 이 주기 기준
+PRESENCE_MAX_AGE = 1.0  # 이보다 오래된 입구 측정값은 사람 없음으로 취급
+
+# check() 판정 결과
+ARRIVED = "ARRIVED"
+LEFT = "LEFT"
+
+
+def is_near(distance, threshold_cm=PERSON_DISTANCE_CM):
+    # 측정 실패(-1)는 사람 없음으로 취급
+    return 0 < distance <= threshold_cm
+
+
+class PresenceDetector:
+    """입구 센서 측정값으로 사람 도착/이탈 판정
+
+    도착은 두 경로로 감지한다: 측정마다 호출되는 on_reading()이 사람이
+    다가오는 순간을 바로 알리고, 주기 확인 check()가 최신 측정값으로
+    다시 확인한다. 이탈은 check()에서 no_person_threshold회 연속으로
+    사람이 없을 때 판정한다.
+    """
+
+    def __init__(self, threshold_cm=PERSON_DISTANCE_CM, no_person_threshold=NO_PERSON_THRESHOLD,
+                 check_interval=PRESENCE_CHECK_INTERVAL, max_age=PRESENCE_MAX_AGE):
+        self.threshold_cm = threshold_cm
+        self.no_person_threshold = no_person_threshold
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.near = False  # 마지막 입구 측정값이 가까웠는지
+        self.no_person_count = 0
+        self.next_check = 0
+
+    def on_reading(self, distance):
+        """입구 측정마다 호출, 사람이 새로 다가왔으면 True (즉시 도착 처리)"""
+        near = is_near(distance, self.threshold_cm)
+        arrived = near and not self.near
+        self.near = near
+        return arrived
+
+    def check(self, now, latest, active):
+        """주기 확인, latest는 최신 (측정 시각, 거리) 또는 None, active는 사람 응대 중 여부
+
+        확인 시각이 아니면 None, 사람이 있고 응대 중이 아니면 ARRIVED,
+        응대 중에 사람이 사라진 상태가 이어지면 LEFT를 반환한다.
+        """
+        if now < self.next_check:
+            return None
+        self.next_check = now + self.check_interval
+        if latest is not None and now - latest[0] <= self.max_age and is_near(latest[1], self.threshold_cm):
+            self.no_person_count = 0
+            return None if active else ARRIVED
+        if not active:
+            return None
+        self.no_person_count += 1
+        if self.no_person_count >= self.no_person_threshold:
+            return LEFT
+        return None
+
+    def reset(self):
+        """이탈 카운터 초기화 (상태가 바뀌었을 때)"""
+        self.no_person_count = 0
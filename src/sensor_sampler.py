@@ -0,0 +1,261 @@
+# sensor_sampler.py
+
+import threading
+import time
+from collections import deque
+
+import hardware_manager
+import metrics
+import spot_detector
+import trigger_scheduler
+
+# 센서 인덱스 (hardware_manager.ULTRASONIC_TRIG_PINS 기준)
+ENTRANCE_SENSOR_INDEX = 0
+
+# 센서별 측정 주기(초)와 링 버퍼 크기
+ENTRANCE_SAMPLE_PERIOD = 0.1
+SPOT_SAMPLE_PERIOD = 0.2
+SPOT_IDLE_SAMPLE_PERIOD = 0.5  # 대기 상태에서의 우산 센서 측정 주기
+SPOT_BUFFER_SIZE = 8
+# 간섭하는 센서끼리(같은 센서 포함) 트리거 사이 최소 간격(초), HC-SR04 측정 주기 약 60ms
+# (ULTRASONIC_TIMEOUT 이후에도 남은 반사파가 다음 측정에 잡히지 않도록)
+ULTRASONIC_GUARD_INTERVAL = 0.06
+
+# DHT22 측정 주기(초, 센서 최소 간격 2초 이상)와 유효 기간
+HUMIDITY_SAMPLE_PERIOD = 2.5
+HUMIDITY_HISTORY_SIZE = 48
+HUMIDITY_STALE_AGE = 30.0
+
+
+class UltrasonicSampler:
+    """초음파 센서를 슬롯 단위로 주기 측정하여 링 버퍼에 기록
+
+    서로 간섭하지 않는 센서는 같은 슬롯에서 동시에 트리거하고 에코를 한 번에
+    측정한다 (trigger_scheduler, stand_config의 interference). 간섭하는 센서는
+    이전 트리거 후 guard_interval이 지나야 다시 트리거하며, 슬롯마다 시작
+    위상을 guard_interval씩 어긋나게 둔다.
+    """
+
+    def __init__(self, periods=None, buffer_size=SPOT_BUFFER_SIZE, interference=None,
+                 guard_interval=ULTRASONIC_GUARD_INTERVAL):
+        # periods: {센서 인덱스: 측정 주기(초)}
+        if periods is None:
+            periods = {ENTRANCE_SENSOR_INDEX: ENTRANCE_SAMPLE_PERIOD}
+            for idx in range(1, len(hardware_manager.ULTRASONIC_TRIG_PINS)):
+                periods[idx] = SPOT_SAMPLE_PERIOD
+        if interference is None:
+            interference = hardware_manager.ULTRASONIC_INTERFERENCE
+        self.periods = dict(periods)
+        self.slots = trigger_scheduler.plan_slots(sorted(self.periods), interference)
+        self.guard_interval = guard_interval
+        # 센서 번호 -> 트리거 간격을 지켜야 하는 센서 집합 (자기 자신 포함)
+        self._interferers = {
+            idx: others | {idx}
+            for idx, others in trigger_scheduler.interference_graph(sorted(self.periods), interference).items()
+        }
+        self.buffers = {idx: deque(maxlen=buffer_size) for idx in self.periods}
+        self.listeners = {idx: [] for idx in self.periods}
+        self.detector = spot_detector.SprtDetector(max_pulses=buffer_size)
+        # 센서별 측정 시간과 결과 (측정 루프에서 매번 조회하지 않도록 미리 생성)
+        self._read_seconds = {
+            idx: metrics.histogram("umbrella_ultrasonic_read_seconds",
+                                   "Ultrasonic measurement latency", sensor=idx)
+            for idx in self.periods
+        }
+        self._read_results = {
+            (idx, ok): metrics.counter("umbrella_ultrasonic_reads_total", "Ultrasonic measurements",
+                                       sensor=idx, result="ok" if ok else "timeout")
+            for idx in self.periods for ok in (True, False)
+        }
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ultrasonic", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def set_period(self, idx, period):
+        """측정 주기 변경 (다음 측정부터 적용)"""
+        self.periods[idx] = period
+
+    def add_listener(self, idx, callback):
+        """측정마다 callback(idx, 측정 시각, 거리) 호출 (측정 스레드에서 실행)"""
+        self.listeners[idx].append(callback)
+
+    def scan_slot(self, sensors):
+        """같은 슬롯의 센서를 동시에 측정하여 버퍼에 기록"""
+        started = time.perf_counter()
+        distances = hardware_manager._measure_distances(
+            [hardware_manager.ULTRASONIC_TRIG_PINS[idx] for idx in sensors],
+            [hardware_manager.ULTRASONIC_ECHO_PINS[idx] for idx in sensors],
+        )
+        elapsed = time.perf_counter() - started
+        timestamp = time.monotonic()
+        with self._lock:
+            for idx, distance in zip(sensors, distances):
+                self.buffers[idx].append((timestamp, distance))
+        for idx, distance in zip(sensors, distances):
+            self._read_seconds[idx].observe(elapsed)
+            self._read_results[idx, distance >= 0].inc()
+        for idx, distance in zip(sensors, distances):
+            for callback in self.listeners[idx]:
+                callback(idx, timestamp, distance)
+
+    def _run(self):
+        start = time.monotonic()
+        # 슬롯별 시작 위상을 어긋나게 두어 첫 측정부터 보호 간격 대기가 몰리지 않도록
+        next_time = {idx: start + i * self.guard_interval
+                     for i, slot in enumerate(self.slots) for idx in slot}
+        last_trigger = {}  # 센서 번호 -> 마지막 트리거 시각
+        while not self._stop_event.is_set():
+            # 측정 시각이 된 센서만 슬롯 순서대로 측정 (슬롯끼리는 순차)
+            for slot in self.slots:
+                now = time.monotonic()
+                due = [idx for idx in slot if next_time[idx] <= now]
+                if not due:
+                    continue
+                # 간섭하는 센서의 이전 에코가 사라질 때까지 대기
+                clear_at = max((last_trigger[other] + self.guard_interval
+                                for idx in due for other in self._interferers[idx]
+                                if other in last_trigger), default=now)
+                if clear_at > now:
+                    if self._stop_event.wait(clear_at - now):
+                        return
+                    now = time.monotonic()
+                for idx in due:
+                    last_trigger[idx] = now
+                self.scan_slot(due)
+                for idx in due:
+                    next_time[idx] += self.periods[idx]
+                    if next_time[idx] < now:  # 측정이 주기보다 길어지면 일정 재조정
+                        next_time[idx] = now
+            delay = min(next_time.values()) - time.monotonic()
+            self._stop_event.wait(max(delay, 0))
+
+    def _snapshot(self, idx):
+        with self._lock:
+            return list(self.buffers[idx])
+
+    def latest(self, idx):
+        """가장 최근 (측정 시각, 거리), 측정값이 없으면 None"""
+        readings = self._snapshot(idx)
+        return readings[-1] if readings else None
+
+    def filtered_distance(self, idx):
+        """버퍼 내 유효 측정값의 중앙값, 유효값이 없으면 -1"""
+        valid = sorted(d for _, d in self._snapshot(idx) if d > 0)
+        if not valid:
+            return -1
+        return valid[len(valid) // 2]
+
+    def is_ready(self, idx):
+        """링 버퍼가 가득 찼는지 (판정에 충분한 측정값 확보)"""
+        with self._lock:
+            return len(self.buffers[idx]) == self.buffers[idx].maxlen
+
+    def spot_umbrella_status(self, spot_id, prev_status):
+        """링 버퍼의 최신 측정값부터 SPRT 판정 (확실해지면 버퍼가 다 차기 전에도 결정)"""
+        if spot_id not in self.buffers or spot_id == ENTRANCE_SENSOR_INDEX:
+            return False
+
+        readings = self._snapshot(spot_id)
+        status, _ = self.detector.decide((d for _, d in reversed(readings)), prev_status)
+        return prev_status if status is None else status
+
+
+class HumiditySampler:
+    """DHT22를 백그라운드에서 주기 측정하여 최신값과 이력을 캐시"""
+
+    def __init__(
+        self,
+        period=HUMIDITY_SAMPLE_PERIOD,
+        history_size=HUMIDITY_HISTORY_SIZE,
+        stale_age=HUMIDITY_STALE_AGE,
+    ):
+        self.period = max(period, 2.0)  # DHT22 최소 측정 간격
+        self.stale_age = stale_age
+        self.history = deque(maxlen=history_size)  # (측정 시각, 습도) 유효값만
+        self.failures = 0
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="humidity", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.period + 1.0)
+            self._thread = None
+
+    def add_listener(self, callback):
+        """측정마다 callback(측정 시각, 습도 또는 None) 호출 (측정 스레드에서 실행)"""
+        self.listeners.append(callback)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            humidity = hardware_manager.read_humidity_once()
+            timestamp = time.monotonic()
+            with self._lock:
+                if humidity is None:
+                    self.failures += 1
+                else:
+                    self.history.append((timestamp, humidity))
+            for callback in self.listeners:
+                callback(timestamp, humidity)
+            self._stop_event.wait(self.period)
+
+    def latest(self):
+        """가장 최근 유효 (측정 시각, 습도), 측정값이 없으면 None"""
+        with self._lock:
+            return self.history[-1] if self.history else None
+
+    def age(self):
+        """최근 유효값의 경과 시간(초), 측정값이 없으면 None"""
+        reading = self.latest()
+        if reading is None:
+            return None
+        return time.monotonic() - reading[0]
+
+    def is_stale(self):
+        age = self.age()
+        return age is None or age > self.stale_age
+
+    def get_humidity(self):
+        """캐시된 습도 즉시 반환, 오래된 값이면 None"""
+        reading = self.latest()
+        if reading is None or time.monotonic() - reading[0] > self.stale_age:
+            return None
+        return reading[1]
+
+    def trend(self, window=60.0):
+        """최근 window초 습도 변화율(%/분, 최소제곱 기울기), 데이터 부족 시 None"""
+        now = time.monotonic()
+        with self._lock:
+            points = [(t, h) for t, h in self.history if now - t <= window]
+        if len(points) < 3:
+            return None
+
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_h = sum(h for _, h in points) / len(points)
+        var_t = sum((t - mean_t) ** 2 for t, _ in points)
+        if var_t == 0:
+            return None
+        cov = sum((t - mean_t) * (h - mean_h) for t, h in points)
+        return cov / var_t * 60.0
@@ -0,0 +1,118 @@
+# sensor_trace.py
+# 센서 측정값과 인식 결과를 고정 길이 바이너리 레코드로 기록/읽기
+#
+# 파일 구조: 헤더(매직 "UMBT", 버전, 기록 시작 시각) + 레코드 반복
+# 레코드: 종류(u8) 채널(u16) 시각(u32, 기록 시작 후 ms) 값(f32) = 11바이트
+#   KIND_DISTANCE    채널=초음파 센서 번호, 값=거리(cm, 실패 -1)
+#   KIND_HUMIDITY    채널=0, 값=습도(%, 실패 NaN)
+#   KIND_RECOGNITION 채널=사용자 번호(0: 인식 실패), 값=인식 소요 시간(초)
+#   KIND_NAME        채널=사용자 번호, 값=이름 길이, 뒤에 UTF-8 이름 (사용자 번호 정의)
+
+import math
+import os
+import struct
+import threading
+import time
+
+TRACE_MAGIC = b"UMBT"
+TRACE_VERSION = 1
+HEADER = struct.Struct("<4sBd")
+RECORD = struct.Struct("<BHIf")
+
+KIND_NAME = 0
+KIND_DISTANCE = 1
+KIND_HUMIDITY = 2
+KIND_RECOGNITION = 3
+
+FLUSH_INTERVAL = 1.0  # 디스크 기록 주기(초)
+
+
+class TraceWriter:
+    """운영 중 측정값을 추가 기록 (여러 스레드에서 호출 가능)
+
+    시각은 time.monotonic() 값을 받아 기록 시작 기준 ms로 저장한다.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, time.time()))
+        self._start = time.monotonic()
+        self._names = {None: 0}
+        self._lock = threading.Lock()
+        self._last_flush = self._start
+
+    def _write(self, kind, channel, timestamp, value, extra=b""):
+        ms = max(int((timestamp - self._start) * 1000), 0)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(RECORD.pack(kind, channel, ms, value) + extra)
+            if timestamp - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = timestamp
+
+    def distance(self, sensor, timestamp, distance):
+        self._write(KIND_DISTANCE, sensor, timestamp, distance)
+
+    def humidity(self, timestamp, humidity):
+        self._write(KIND_HUMIDITY, 0, timestamp, math.nan if humidity is None else humidity)
+
+    def recognition(self, timestamp, user_id, duration):
+        channel = self._names.get(user_id)
+        if channel is None:
+            channel = len(self._names)
+            self._names[user_id] = channel
+            name = str(user_id).encode("utf-8")
+            self._write(KIND_NAME, channel, timestamp, len(name), name)
+        self._write(KIND_RECOGNITION, channel, timestamp, duration)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_trace(path):
+    """(시작 시각(epoch), [(종류, 채널, 시각(초), 값)]) 반환
+
+    인식 레코드의 값은 (사용자 ID 또는 None, 소요 시간)이며, 기록 중 잘린
+    마지막 레코드는 버린다.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: not a sensor trace")
+    magic, version, started = HEADER.unpack_from(data, 0)
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"{path}: not a sensor trace (version {version})")
+
+    names = {0: None}
+    records = []
+    pos = HEADER.size
+    while pos + RECORD.size <= len(data):
+        kind, channel, ms, value = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        if kind == KIND_NAME:
+            size = int(value)
+            if pos + size > len(data):
+                break
+            names[channel] = data[pos:pos + size].decode("utf-8")
+            pos += size
+            continue
+        t = ms / 1000.0
+        if kind == KIND_HUMIDITY and math.isnan(value):
+            value = None
+        elif kind == KIND_RECOGNITION:
+            value = (names.get(channel), value)
+        records.append((kind, channel, t, value))
+    return started, records
+
+
+def is_trace_file(path):
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(TRACE_MAGIC)) == TRACE_MAGIC
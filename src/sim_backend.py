@@ -0,0 +1,280 @@
+# sim_backend.py
+# 라즈베리 파이 없이 실행하기 위한 가상 하드웨어 (UMBRELLA_BACKEND=sim)
+# RPi.GPIO, adafruit_dht, board, picamera2 대신 사용되며 모두 모듈 전역 stand를 공유
+# 시나리오는 실제 시간으로 진행 (에코 폭, 카메라 프레임 간격 모두 실제 시간 기준)
+
+import glob
+import os
+import random
+import threading
+import time
+import types
+
+import stand_config
+
+SOUND_SPEED = 34300       # cm/s, hardware_manager와 동일
+ECHO_DELAY = 0.0005       # 트리거 후 에코 시작까지(초)
+ENTRANCE_NEAR_CM = 5.0    # 사람이 서 있을 때 입구 센서 거리
+ENTRANCE_FAR_CM = 120.0
+SPOT_OCCUPIED_CM = 3.0    # 우산이 있을 때 자리 센서 거리
+SPOT_EMPTY_CM = 20.0
+FRAME_PERIOD = 1 / 30     # 가상 카메라 프레임 간격(초)
+
+
+class SimStand:
+    """가상 우산 거치대: 사람, 우산, 습도 상태와 GPIO 출력 기록"""
+
+    def __init__(self, config=None, seed=0):
+        self.rng = random.Random(seed)
+        self._lock = threading.Condition()
+        self.configure(config or stand_config.load_config())
+
+        self.person_present = False
+        self.visitor = None  # 카메라에 보여줄 얼굴 (faces 디렉터리의 이름)
+        self.humidity = 15.0
+        self.dht_fail_rate = 0.2  # DHT22 읽기 실패 확률 (실제 센서도 자주 실패)
+        self.echo_noise_cm = 0.3
+        self.echo_timeout_rate = 0.02
+        self.faces = {}  # 이름 -> 이미지 경로 목록
+        self.events = []  # (monotonic 시각, 종류, 자리 번호, 값)
+
+    def configure(self, config):
+        spots = config["spots"]
+        trig = [config["entrance"]["trig"]] + [spot["trig"] for spot in spots]
+        echo = [config["entrance"]["echo"]] + [spot["echo"] for spot in spots]
+        self.trig_sensor = {pin: idx for idx, pin in enumerate(trig)}
+        self.echo_sensor = {pin: idx for idx, pin in enumerate(echo)}
+        self.led_spot = {spot["led"]: spot_id for spot_id, spot in enumerate(spots, start=1)
+                         if spot.get("led") is not None}
+        self.fan_pin = config["fan_pin"]
+        self.occupied = {spot_id: False for spot_id in range(1, len(spots) + 1)}
+        self.pin_levels = {}
+        self.echo_windows = {}  # 센서 번호 -> (에코 시작, 에코 끝) 또는 None(측정 실패)
+        self.edge_callbacks = {}
+
+    # 시나리오 조작
+    def person_arrives(self, visitor=None):
+        self.visitor = visitor
+        self.person_present = True
+
+    def person_leaves(self):
+        self.person_present = False
+        self.visitor = None
+
+    def insert_umbrella(self, spot_id):
+        self.occupied[spot_id] = True
+
+    def remove_umbrella(self, spot_id):
+        self.occupied[spot_id] = False
+
+    def load_faces(self, faces_dir):
+        """faces_dir/<이름>/*.jpg 를 카메라 프레임으로 사용"""
+        for user_dir in sorted(glob.glob(os.path.join(faces_dir, "*"))):
+            images = sorted(p for p in glob.glob(os.path.join(user_dir, "*"))
+                            if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+            if images:
+                self.faces[os.path.basename(user_dir)] = images
+
+    # 센서 모델
+    def distance(self, sensor):
+        if sensor == 0:
+            d = ENTRANCE_NEAR_CM if self.person_present else ENTRANCE_FAR_CM
+        else:
+            d = SPOT_OCCUPIED_CM if self.occupied.get(sensor) else SPOT_EMPTY_CM
+        return max(d + self.rng.gauss(0, self.echo_noise_cm), 0.5)
+
+    def trigger(self, sensor):
+        now = time.time()
+        if self.rng.random() < self.echo_timeout_rate:
+            self.echo_windows[sensor] = None
+            return
+        rise = now + ECHO_DELAY
+        fall = rise + 2 * self.distance(sensor) / SOUND_SPEED
+        self.echo_windows[sensor] = (rise, fall)
+
+        # 엣지 콜백 모드 (GPIO.add_event_detect)
+        echo_pin = next(pin for pin, idx in self.echo_sensor.items() if idx == sensor)
+        callback = self.edge_callbacks.get(echo_pin)
+        if callback is not None:
+            # 한 스레드에서 상승, 하강 순서대로 호출 (엣지마다 타이머 스레드를 띄우면 순서와 간격이 흔들림)
+            threading.Thread(target=self._deliver_edges, args=(callback, echo_pin, (rise, fall)),
+                             daemon=True).start()
+
+    def _deliver_edges(self, callback, echo_pin, times):
+        for at in times:
+            delay = at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            callback(echo_pin)
+
+    def echo_level(self, echo_pin):
+        window = self.echo_windows.get(self.echo_sensor.get(echo_pin))
+        if window is None:
+            return GPIO.LOW
+        rise, fall = window
+        return GPIO.HIGH if rise <= time.time() < fall else GPIO.LOW
+
+    def read_humidity(self):
+        if self.rng.random() < self.dht_fail_rate:
+            raise RuntimeError("DHT sensor not found, check wiring")
+        return self.humidity
+
+    # 출력 기록
+    def record_output(self, pin, level):
+        previous = self.pin_levels.get(pin)
+        self.pin_levels[pin] = level
+        if previous == level:
+            return
+        if pin in self.led_spot:
+            self._record("spot_led", self.led_spot[pin], level == GPIO.HIGH)
+        elif pin == self.fan_pin:
+            self._record("fan", None, level == GPIO.HIGH)
+
+    def _record(self, kind, spot_id, value):
+        with self._lock:
+            self.events.append((time.monotonic(), kind, spot_id, value))
+            self._lock.notify_all()
+
+    def wait_for(self, kind, spot_id=None, value=True, since=0.0, timeout=30.0):
+        """since(monotonic) 이후 해당 출력 변화가 기록된 실제 시각, 시간 초과면 None"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                for at, k, s, v in self.events:
+                    if at >= since and k == kind and v == value and (spot_id is None or s == spot_id):
+                        return at
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+
+
+stand = SimStand()
+
+
+class _GPIO:
+    """RPi.GPIO 대체"""
+    BCM = "BCM"
+    OUT = "OUT"
+    IN = "IN"
+    HIGH = 1
+    LOW = 0
+    BOTH = "BOTH"
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction):
+        stand.pin_levels.setdefault(pin, self.LOW)
+
+    def output(self, pin, level):
+        if pin in stand.trig_sensor and level == self.LOW and stand.pin_levels.get(pin) == self.HIGH:
+            stand.trigger(stand.trig_sensor[pin])  # 트리거 펄스 하강 시점에 초음파 발사
+        stand.record_output(pin, level)
+
+    def input(self, pin):
+        if pin in stand.echo_sensor:
+            return stand.echo_level(pin)
+        return stand.pin_levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None):
+        stand.edge_callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        stand.edge_callbacks.pop(pin, None)
+
+    def PWM(self, pin, frequency):
+        return _PWM()
+
+    def cleanup(self):
+        stand.pin_levels.clear()
+        stand.edge_callbacks.clear()
+
+
+class _PWM:
+    def start(self, duty):
+        self.duty = duty
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+
+    def stop(self):
+        pass
+
+
+class DHT22:
+    """adafruit_dht.DHT22 대체, 읽기 실패 시 RuntimeError (실제 라이브러리와 동일)"""
+
+    def __init__(self, pin):
+        self.pin = pin
+
+    @property
+    def humidity(self):
+        return stand.read_humidity()
+
+    def exit(self):
+        pass
+
+
+class _Board:
+    """board 대체, 핀 이름을 그대로 반환"""
+
+    def __getattr__(self, name):
+        return name
+
+
+class Picamera2:
+    """picamera2.Picamera2 대체, 사람이 있으면 stand.visitor의 얼굴 이미지를 프레임으로 반환"""
+
+    def __init__(self):
+        self.size = (840, 480)
+        self._images = {}
+        self._index = 0
+        self._last = 0.0
+
+    def create_preview_configuration(self, main=None):
+        return {"main": main or {}}
+
+    def configure(self, cfg):
+        self.size = tuple(cfg["main"].get("size", self.size))
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def _load(self, path):
+        import cv2
+        import numpy as np
+
+        if path not in self._images:
+            img = cv2.imread(path)
+            canvas = np.full((self.size[1], self.size[0], 3), 90, dtype=np.uint8)
+            if img is not None:
+                h = self.size[1]
+                w = min(int(img.shape[1] * h / img.shape[0]), self.size[0])
+                x = (self.size[0] - w) // 2
+                canvas[:, x:x + w] = cv2.resize(img, (w, h))
+            self._images[path] = canvas
+        return self._images[path]
+
+    def capture_array(self):
+        import numpy as np
+
+        # 카메라 프레임 속도 흉내
+        delay = self._last + FRAME_PERIOD - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last = time.monotonic()
+
+        images = stand.faces.get(stand.visitor) if stand.person_present else None
+        if not images:
+            return np.full((self.size[1], self.size[0], 3), 90, dtype=np.uint8)
+        self._index += 1
+        return self._load(images[self._index % len(images)]).copy()
+
+
+GPIO = _GPIO()
+adafruit_dht = types.SimpleNamespace(DHT22=DHT22)
+board = _Board()
@@ -0,0 +1,98 @@
+# spot_detector.py
+
+import math
+
+# 기존 판정 규칙: 펄스 8회 중 임계값(보관 중 8cm, 비어 있음 5cm) 미만이 5회 초과면 우산 있음
+SPOT_MAX_PULSES = 8
+SPOT_MIN_HITS = 6
+SPOT_THRESHOLD_OCCUPIED_CM = 8
+SPOT_THRESHOLD_EMPTY_CM = 5
+
+# 펄스 1회가 임계값 안에 들어올 확률 (우산 있음 / 없음)
+HIT_PROB_OCCUPIED = 0.9
+HIT_PROB_EMPTY = 0.1
+
+# 오판 허용 확률: 이전 상태를 바꾸는 판정은 엄격하게, 유지하는 판정은 느슨하게
+FLIP_ERROR = 0.001
+KEEP_ERROR = 0.05
+
+
+def spot_threshold(prev_status, empty_cm=SPOT_THRESHOLD_EMPTY_CM, occupied_cm=SPOT_THRESHOLD_OCCUPIED_CM):
+    """히스테리시스 임계값(cm)"""
+    return occupied_cm if prev_status else empty_cm
+
+
+def is_hit(distance, threshold):
+    # 측정 실패(-1)는 우산 없음 쪽 측정으로 취급
+    return 0 <= distance < threshold
+
+
+def majority_status(distances, prev_status, empty_cm=SPOT_THRESHOLD_EMPTY_CM,
+                    occupied_cm=SPOT_THRESHOLD_OCCUPIED_CM, min_hits=SPOT_MIN_HITS):
+    """기존 고정 8회 판정 규칙"""
+    threshold = spot_threshold(prev_status, empty_cm, occupied_cm)
+    return min_hits <= sum(1 for d in distances if is_hit(d, threshold))
+
+
+class SprtDetector:
+    """순차 확률비 검정(SPRT)으로 우산 유무 판정
+
+    펄스마다 로그 우도비를 누적하여 경계를 넘는 즉시 판정을 끝낸다.
+    max_pulses까지 판정이 나지 않으면 기존 과반 규칙으로 결정한다.
+    """
+
+    def __init__(
+        self,
+        p_occupied=HIT_PROB_OCCUPIED,
+        p_empty=HIT_PROB_EMPTY,
+        flip_error=FLIP_ERROR,
+        keep_error=KEEP_ERROR,
+        max_pulses=SPOT_MAX_PULSES,
+        empty_cm=SPOT_THRESHOLD_EMPTY_CM,
+        occupied_cm=SPOT_THRESHOLD_OCCUPIED_CM,
+        min_hits=SPOT_MIN_HITS,
+    ):
+        self.max_pulses = max_pulses
+        self.empty_cm = empty_cm
+        self.occupied_cm = occupied_cm
+        self.min_hits = min_hits
+        self.hit_llr = math.log(p_occupied / p_empty)
+        self.miss_llr = math.log((1 - p_occupied) / (1 - p_empty))
+        # 검정: H1 우산 있음 vs H0 우산 없음
+        # 이전 상태가 없음이면 H1 채택이 상태 변경(flip), 있음이면 H0 채택이 변경
+        self._bounds = {
+            False: (math.log((1 - keep_error) / flip_error), math.log(keep_error / (1 - flip_error))),
+            True: (math.log((1 - flip_error) / keep_error), math.log(flip_error / (1 - keep_error))),
+        }
+
+    def update(self, llr, distance, prev_status):
+        """측정 1회 반영 후 누적 로그 우도비"""
+        threshold = spot_threshold(prev_status, self.empty_cm, self.occupied_cm)
+        return llr + (self.hit_llr if is_hit(distance, threshold) else self.miss_llr)
+
+    def verdict(self, llr, prev_status):
+        """판정이 나면 True/False, 아직이면 None"""
+        upper, lower = self._bounds[prev_status]
+        if llr >= upper:
+            return True
+        if llr <= lower:
+            return False
+        return None
+
+    def decide(self, distances, prev_status):
+        """측정값을 순서대로 소비하여 (판정, 사용한 펄스 수) 반환
+
+        distances는 필요한 만큼만 읽으므로 펄스를 발사하는 제너레이터를 넘기면
+        판정이 나는 즉시 측정이 멈춘다. 측정값이 부족하면 (None, 사용 수).
+        """
+        llr = 0.0
+        used = []
+        for distance in distances:
+            used.append(distance)
+            llr = self.update(llr, distance, prev_status)
+            status = self.verdict(llr, prev_status)
+            if status is not None:
+                return status, len(used)
+            if len(used) >= self.max_pulses:
+                return majority_status(used, prev_status, self.empty_cm, self.occupied_cm, self.min_hits), len(used)
+        return None, len(used)
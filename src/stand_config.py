@@ -0,0 +1,67 @@
+# stand_config.py
+
+import json
+import os
+
+# 설정 파일 경로 (없으면 DEFAULT_CONFIG 사용)
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stand_config.json")
+
+# 기본 구성: 입구 센서 1개, 우산 자리 2개
+# spots 순서가 곧 자리 번호(1부터)이며, user는 자리에 고정 배정된 사용자,
+# face는 그 사용자의 얼굴 인식 모델 이름 (faces/<이름>, 없으면 user와 같은 이름)
+DEFAULT_CONFIG = {
+    "fan_pin": 17,
+    "weather_rgb_pins": [26, 19, 13],  # R, G, B
+    "dht_pin": "D4",  # board 모듈의 핀 이름
+    "entrance": {"trig": 5, "echo": 6},
+    "spots": [
+        {"trig": 20, "echo": 23, "led": 11, "user": "user_A", "face": "user1"},
+        {"trig": 21, "echo": 24, "led": 14, "user": "user_B", "face": "user2"},
+    ],
+    # 서로 간섭하는 초음파 센서 번호 쌍 (0: 입구, i: 자리 i), None이면 모두 간섭(순차 측정)
+    "interference": None,
+}
+
+
+def _validate(config):
+    spots = config["spots"]
+    users = [spot["user"] for spot in spots if spot.get("user")]
+    if len(users) != len(set(users)):
+        raise ValueError("stand config: 한 사용자에게 두 자리 이상 배정됨")
+    faces = [spot["face"] for spot in spots if spot.get("user") and spot.get("face")]
+    if len(faces) != len(set(faces)):
+        raise ValueError("stand config: 한 얼굴 이름이 두 사용자에게 배정됨")
+
+    pins = [config["fan_pin"], *config["weather_rgb_pins"],
+            config["entrance"]["trig"], config["entrance"]["echo"]]
+    for spot in spots:
+        pins += [spot["trig"], spot["echo"]]
+        if spot.get("led") is not None:
+            pins.append(spot["led"])
+    if len(pins) != len(set(pins)):
+        raise ValueError("stand config: GPIO 핀 중복")
+
+    if config.get("interference") is not None:
+        for pair in config["interference"]:
+            if len(pair) != 2 or not all(0 <= s <= len(spots) for s in pair):
+                raise ValueError(f"stand config: 잘못된 간섭 쌍 {pair}")
+
+
+def load_config(path=CONFIG_PATH):
+    """설정 파일을 읽어 기본값과 병합, 파일이 없으면 기본 구성"""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))  # 기본값 복사
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    _validate(config)
+    return config
+
+
+def spot_users(config):
+    """자리 번호 -> 배정 사용자 (없으면 None)"""
+    return {spot_id: spot.get("user") for spot_id, spot in enumerate(config["spots"], start=1)}
+
+
+def face_users(config):
+    """얼굴 인식 이름 -> 배정 사용자 (사용자가 배정된 자리만)"""
+    return {spot.get("face") or spot["user"]: spot["user"] for spot in config["spots"] if spot.get("user")}
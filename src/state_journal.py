@@ -0,0 +1,92 @@
+# state_journal.py
+
+import json
+import os
+import time
+
+# 우산 보관 상태 저널 (작업 디렉터리 기준)
+JOURNAL_PATH = "umbrella_journal.log"
+SNAPSHOT_PATH = "umbrella_state.json"
+
+# 저널 레코드가 이 개수를 넘으면 스냅샷으로 압축
+COMPACT_RECORDS = 1000
+
+
+class StateJournal:
+    """자리 상태 변화를 추가 전용 로그로 기록하고 재시작 시 재생
+
+    레코드는 한 줄짜리 JSON이며 자리의 변경 후 상태 전체를 담으므로
+    같은 레코드를 여러 번 재생해도 결과가 같다. 기록 중 전원이 끊겨
+    마지막 줄이 줄바꿈 없이 끝난 경우 그 줄만 버린다.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, snapshot_path=SNAPSHOT_PATH, compact_records=COMPACT_RECORDS):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.compact_records = compact_records
+        self.records = 0
+        self._file = None
+
+    def load(self):
+        """스냅샷과 저널을 재생하여 {자리 번호: (상태, 사용자)} 반환"""
+        state = {}
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                for spot_id, (status, user_id) in json.load(f)["spots"].items():
+                    state[int(spot_id)] = (status, user_id)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.records = 0
+        valid_size = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # 줄바꿈 전에 끊긴 마지막 레코드 (JSON으로 읽혀도 다음 기록과 붙으므로 버림)
+                    try:
+                        record = json.loads(line)
+                        state[record["spot"]] = (record["status"], record["user"])
+                    except (ValueError, KeyError):
+                        break  # 잘린 레코드, 이후 내용은 무시
+                    valid_size += len(line)
+                    self.records += 1
+        except OSError:
+            pass
+
+        # 잘린 꼬리를 잘라내어 다음 기록이 올바른 줄에서 시작하도록 함
+        if os.path.exists(self.path) and os.path.getsize(self.path) != valid_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_size)
+        return state
+
+    def append(self, spot_id, status, user_id):
+        """자리 상태 변화 1건 기록 (디스크 동기화 후 반환)"""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        record = {"spot": spot_id, "status": status, "user": user_id, "t": round(time.time(), 3)}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records += 1
+
+    def compact(self, state):
+        """현재 상태 전체를 스냅샷으로 저장하고 저널 비우기"""
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"spots": {str(k): list(v) for k, v in state.items()}}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # 스냅샷 교체 후 저널을 비움, 그 사이 중단되어도 저널 재생 결과는 같음
+        self.close()
+        open(self.path, "w").close()
+        self.records = 0
+
+    def needs_compaction(self):
+        return self.records >= self.compact_records
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
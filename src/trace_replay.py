@@ -0,0 +1,282 @@
+# trace_replay.py
+# 기록된 센서 트레이스(sensor_trace)를 실제 시간보다 빠르게 재생하여 판정 파라미터별 성능 비교
+#   python trace_replay.py traces/trace_20250101_090000.umbt
+#   python trace_replay.py traces/*.umbt --empty-cm 4 5 6 --occupied-cm 7 8 9 --no-person 1 2 3
+#
+# 하드웨어 없이 실행되도록 hardware_manager에 의존하는 모듈은 가져오지 않음
+
+import argparse
+import bisect
+import itertools
+import statistics
+import time
+from collections import deque
+
+import presence_detector
+import sensor_trace
+import spot_detector
+
+ENTRANCE_SENSOR = 0  # sensor_sampler.ENTRANCE_SENSOR_INDEX
+
+# 현재 운영 파라미터 (spot_detector, presence_detector 기본값)
+DEFAULT_SPOT_PARAMS = {
+    "empty_cm": spot_detector.SPOT_THRESHOLD_EMPTY_CM,
+    "occupied_cm": spot_detector.SPOT_THRESHOLD_OCCUPIED_CM,
+    "min_hits": spot_detector.SPOT_MIN_HITS,
+    "window": spot_detector.SPOT_MAX_PULSES,
+    "sequential": True,  # False면 버퍼가 찬 뒤 과반 규칙만 사용 (SPRT 도입 전 방식)
+}
+DEFAULT_PRESENCE_PARAMS = {
+    "threshold_cm": presence_detector.PERSON_DISTANCE_CM,
+    "no_person_threshold": presence_detector.NO_PERSON_THRESHOLD,
+    "check_interval": presence_detector.PRESENCE_CHECK_INTERVAL,
+    "max_age": presence_detector.PRESENCE_MAX_AGE,
+}
+
+# 기준 상태: 전후 REFERENCE_WINDOW초 측정값의 중앙값 (미래 값을 쓰므로 재생에서만 가능)
+REFERENCE_WINDOW = 2.0
+REFERENCE_SPOT_CM = 6.5
+REFERENCE_PERSON_CM = 10
+REFERENCE_HOLD = 3.0   # 이보다 짧게 유지된 기준 상태 변화는 무시
+MATCH_WINDOW = 10.0    # 기준 변화 후 이 시간 안에 같은 판정이 나와야 검출로 인정
+
+
+def split_trace(records):
+    """레코드를 센서별 측정값, 습도, 인식 결과로 분리"""
+    distances = {}
+    humidity = []
+    recognitions = []
+    for kind, channel, t, value in records:
+        if kind == sensor_trace.KIND_DISTANCE:
+            distances.setdefault(channel, []).append((t, value))
+        elif kind == sensor_trace.KIND_HUMIDITY:
+            humidity.append((t, value))
+        elif kind == sensor_trace.KIND_RECOGNITION:
+            recognitions.append((t, value))
+    return distances, humidity, recognitions
+
+
+def reference_transitions(readings, threshold_cm, window=REFERENCE_WINDOW, hold=REFERENCE_HOLD):
+    """전후 window초 중앙값 기준 상태 변화 목록 [(시각, 상태)] (짧은 변화 제거)"""
+    times = [t for t, _ in readings]
+    sorted_window = []
+    lo = hi = 0
+    states = []
+    for t, _ in readings:
+        while hi < len(readings) and times[hi] <= t + window:
+            if readings[hi][1] >= 0:
+                bisect.insort(sorted_window, readings[hi][1])
+            hi += 1
+        while times[lo] < t - window:
+            if readings[lo][1] >= 0:
+                del sorted_window[bisect.bisect_left(sorted_window, readings[lo][1])]
+            lo += 1
+        if sorted_window:
+            median = sorted_window[len(sorted_window) // 2]
+            states.append((t, 0 < median <= threshold_cm))
+
+    transitions = []
+    current = False
+    candidate = None
+    for t, state in states:
+        if state == current:
+            candidate = None
+        elif candidate is None:
+            candidate = t
+        elif t - candidate >= hold:
+            current = state
+            transitions.append((candidate, state))
+            candidate = None
+    return transitions
+
+
+def replay_spot(readings, params):
+    """자리 센서 측정값을 링 버퍼 판정에 통과시켜 판정 변화 목록 [(시각, 상태)]"""
+    detector = spot_detector.SprtDetector(
+        max_pulses=params["window"],
+        empty_cm=params["empty_cm"],
+        occupied_cm=params["occupied_cm"],
+        min_hits=params["min_hits"],
+    )
+    buffer = deque(maxlen=params["window"])
+    status = False
+    decisions = []
+    for t, distance in readings:
+        buffer.append(distance)
+        if params["sequential"]:
+            new_status, _ = detector.decide(reversed(buffer), status)
+        elif len(buffer) == buffer.maxlen:
+            new_status = spot_detector.majority_status(
+                buffer, status, params["empty_cm"], params["occupied_cm"], params["min_hits"])
+        else:
+            new_status = None
+        if new_status is not None and new_status != status:
+            status = new_status
+            decisions.append((t, status))
+    return decisions
+
+
+def replay_presence(readings, params):
+    """입구 센서 측정값으로 main.py의 사람 감지/이탈 판정 재현 [(시각, 사람 있음)]
+
+    main.py처럼 측정마다 즉시 도착 판정을, check_interval마다 주기 확인을 한다.
+    """
+    if not readings:
+        return []
+    detector = presence_detector.PresenceDetector(**params)
+    decisions = []
+    active = False
+    latest = None
+    t = readings[0][0]
+    end = readings[-1][0]
+
+    def check_until(limit):
+        # limit 이전의 주기 확인 (같은 시각의 측정값은 확인 전에 반영됨)
+        nonlocal t, active
+        while t < limit and t <= end:
+            result = detector.check(t, latest, active)
+            if result is not None:
+                active = result == presence_detector.ARRIVED
+                detector.reset()
+                decisions.append((t, active))
+            t += params["check_interval"]
+
+    for reading_t, distance in readings:
+        check_until(reading_t)
+        latest = (reading_t, distance)
+        if detector.on_reading(distance) and not active:
+            active = True
+            detector.reset()
+            decisions.append((reading_t, True))
+    check_until(float("inf"))
+    return decisions
+
+
+def score(decisions, reference, match_window=MATCH_WINDOW, lead=REFERENCE_WINDOW):
+    """기준 변화와 판정 변화를 짝지어 (지연 시간 목록, 놓친 수, 오검출 수)"""
+    used = set()
+    latencies = []
+    missed = 0
+    for t_ref, state in reference:
+        start = bisect.bisect_left(decisions, (t_ref - lead,))
+        for j in range(start, len(decisions)):
+            t_dec, dec_state = decisions[j]
+            if t_dec > t_ref + match_window:
+                missed += 1
+                break
+            if j not in used and dec_state == state:
+                used.add(j)
+                latencies.append(t_dec - t_ref)
+                break
+        else:
+            missed += 1
+    return latencies, missed, len(decisions) - len(used)
+
+
+def _summary(name, decisions, latencies, missed, false):
+    if latencies:
+        ordered = sorted(latencies)
+        lat = (f"latency mean {statistics.fmean(ordered):5.2f}s "
+               f"p95 {ordered[int(0.95 * (len(ordered) - 1))]:5.2f}s")
+    else:
+        lat = "latency      -"
+    return f"{name:<52} {decisions:6d} decisions  {lat}  missed {missed:4d}  false {false:4d}"
+
+
+def _param_grid(defaults, overrides):
+    keys = [k for k, v in overrides.items() if v]
+    for values in itertools.product(*(overrides[k] for k in keys)):
+        params = dict(defaults)
+        params.update(zip(keys, values))
+        yield params
+
+
+def replay(paths, spot_overrides, presence_overrides):
+    records = []
+    duration = 0.0
+    for path in paths:
+        _, trace_records = sensor_trace.read_trace(path)
+        # 여러 파일은 시간 순서대로 이어 붙임
+        records += [(k, c, t + duration, v) for k, c, t, v in trace_records]
+        if trace_records:
+            duration += trace_records[-1][2] + 1.0
+    distances, humidity, recognitions = split_trace(records)
+
+    wall = time.perf_counter()
+    print(f"trace: {len(records)} records, {duration / 3600:.2f} h, "
+          f"sensors {sorted(distances)}")
+
+    failed = sum(1 for _, h in humidity if h is None)
+    if humidity:
+        print(f"humidity: {len(humidity)} reads, {100 * failed / len(humidity):.1f}% failed")
+    if recognitions:
+        ok = [d for _, (user, d) in recognitions if user]
+        print(f"recognition: {len(recognitions)} runs, {len(ok)} recognized"
+              + (f", mean {statistics.fmean(ok):.2f}s" if ok else ""))
+
+    print("\n[spot detection]")
+    spot_refs = {
+        s: reference_transitions(r, REFERENCE_SPOT_CM)
+        for s, r in distances.items() if s != ENTRANCE_SENSOR
+    }
+    for params in _param_grid(DEFAULT_SPOT_PARAMS, spot_overrides):
+        total = [0, [], 0, 0]
+        for spot_id, ref in spot_refs.items():
+            decisions = replay_spot(distances[spot_id], params)
+            latencies, missed, false = score(decisions, ref)
+            total[0] += len(decisions)
+            total[1] += latencies
+            total[2] += missed
+            total[3] += false
+        name = (f"empty {params['empty_cm']}cm occupied {params['occupied_cm']}cm "
+                f"hits {params['min_hits']}/{params['window']}"
+                f"{' sprt' if params['sequential'] else ''}")
+        print(_summary(name, *total))
+
+    if ENTRANCE_SENSOR in distances:
+        print("\n[person presence]")
+        entrance = distances[ENTRANCE_SENSOR]
+        ref = reference_transitions(entrance, REFERENCE_PERSON_CM)
+        for params in _param_grid(DEFAULT_PRESENCE_PARAMS, presence_overrides):
+            decisions = replay_presence(entrance, params)
+            latencies, missed, false = score(decisions, ref)
+            name = (f"threshold {params['threshold_cm']}cm no_person {params['no_person_threshold']} "
+                    f"every {params['check_interval']}s")
+            print(_summary(name, len(decisions), latencies, missed, false))
+
+    wall = time.perf_counter() - wall
+    print(f"\nreplayed in {wall:.2f}s ({duration / max(wall, 1e-9):.0f}x real time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay sensor traces against detection parameters")
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--empty-cm", type=float, nargs="+")
+    parser.add_argument("--occupied-cm", type=float, nargs="+")
+    parser.add_argument("--min-hits", type=int, nargs="+")
+    parser.add_argument("--window", type=int, nargs="+")
+    parser.add_argument("--majority", action="store_true", help="also replay the fixed majority rule")
+    parser.add_argument("--person-cm", type=float, nargs="+")
+    parser.add_argument("--no-person", type=int, nargs="+")
+    parser.add_argument("--check-interval", type=float, nargs="+")
+    args = parser.parse_args()
+
+    replay(
+        args.traces,
+        {
+            "empty_cm": args.empty_cm,
+            "occupied_cm": args.occupied_cm,
+            "min_hits": args.min_hits,
+            "window": args.window,
+            "sequential": [True, False] if args.majority else None,
+        },
+        {
+            "threshold_cm": args.person_cm,
+            "no_person_threshold": args.no_person,
+            "check_interval": args.check_interval,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
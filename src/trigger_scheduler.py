@@ -0,0 +1,38 @@
+# trigger_scheduler.py
+
+# 초음파 센서 간섭 지도 기반 트리거 슬롯 배정
+# 서로 간섭하지 않는 센서는 같은 슬롯에서 동시에 트리거하고, 간섭하는 센서는 다른 슬롯으로 분리
+
+
+def interference_graph(sensor_ids, interference):
+    """센서 번호 -> 간섭하는 센서 집합
+
+    interference가 None이면 모든 센서가 서로 간섭한다고 보고(순차 측정),
+    아니면 [a, b] 쌍 목록에 있는 센서끼리만 간섭한다.
+    """
+    sensor_ids = list(sensor_ids)
+    if interference is None:
+        return {s: set(sensor_ids) - {s} for s in sensor_ids}
+    graph = {s: set() for s in sensor_ids}
+    for a, b in interference:
+        if a in graph and b in graph and a != b:
+            graph[a].add(b)
+            graph[b].add(a)
+    return graph
+
+
+def plan_slots(sensor_ids, interference):
+    """간섭하는 센서끼리 같은 슬롯에 들어가지 않도록 슬롯 목록 생성
+
+    간섭이 많은 센서부터 들어갈 수 있는 첫 슬롯에 배정하는 그리디 그래프 색칠.
+    """
+    graph = interference_graph(sensor_ids, interference)
+    slots = []
+    for sensor in sorted(graph, key=lambda s: (-len(graph[s]), s)):
+        for slot in slots:
+            if not graph[sensor] & set(slot):
+                slot.append(sensor)
+                break
+        else:
+            slots.append([sensor])
+    return [sorted(slot) for slot in slots]
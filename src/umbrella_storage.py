@@ -1,87 +1,184 @@
 # umbrella_storage.py
 
+from array import array
+
+import stand_config
+
+NO_USER = -1
+
 class UmbrellaStorage:
-    
-    #User A는 Spot 1, User B는 Spot 2를 사용
-    def __init__(self):
-        self.user_spot_map = {
-            "user_A": 1,
-            "user_B": 2
-        }
-        
-        self.spots = {
-            1: {"status": False, "user": None, "previous_status": False},
-            2: {"status": False, "user": None, "previous_status": False}
-        }
-        self.num_spots = len(self.spots)
+    """N개 자리의 우산 보관 상태
 
-    def _get_spot_index(self, spot_id):
-        if spot_id not in self.spots:
-            return None
-        return spot_id
+    자리 상태와 이전 상태는 정수 비트셋(비트 i = 자리 i)으로, 배정 사용자와
+    현재 보관 사용자는 사용자 번호 배열로 보관한다.
+    """
+
+    def __init__(self, spot_users=None, journal=None):
+        # spot_users: {자리 번호(1부터): 배정 사용자 ID 또는 None}, 기본은 설정 파일
+        # journal: 상태 변화를 기록할 state_journal.StateJournal (없으면 메모리에만 보관)
+        if spot_users is None:
+            spot_users = stand_config.spot_users(stand_config.load_config())
+        self.num_spots = len(spot_users)
+        if sorted(spot_users) != list(range(1, self.num_spots + 1)):
+            raise ValueError("spot ids must be 1..N")
+
+        # 사용자 ID <-> 사용자 번호
+        self.users = []
+        self.user_index = {}
+        # 인덱스 0은 사용하지 않음 (자리 번호를 그대로 인덱스로 사용)
+        self.assigned = array("i", [NO_USER] * (self.num_spots + 1))
+        self.holder = array("i", [NO_USER] * (self.num_spots + 1))
+        self.user_spot = array("i")  # 사용자 번호 -> 배정 자리
+
+        for spot_id, user_id in spot_users.items():
+            if not user_id:
+                continue
+            if user_id in self.user_index:
+                raise ValueError(f"user {user_id} is assigned to more than one spot")
+            self.user_index[user_id] = len(self.users)
+            self.users.append(user_id)
+            self.user_spot.append(spot_id)
+            self.assigned[spot_id] = self.user_index[user_id]
+
+        self.status_bits = 0
+        self.previous_bits = 0
+        self._scanned_bits = 0  # changes_since_last_scan 기준
+
+        self.journal = journal
+        self.restored_bits = 0  # 저널에서 복원되어 센서 확인 전인 자리
+        if journal is not None:
+            self._restore(journal.load())
+
+    def _restore(self, state):
+        """저널에서 읽은 마지막 상태 적용"""
+        for spot_id, (status, user_id) in state.items():
+            if not self._valid_spot(spot_id) or not status:
+                continue
+            self.status_bits |= 1 << spot_id
+            self.holder[spot_id] = self.user_index.get(user_id, NO_USER)
+        self.previous_bits = self.status_bits
+        self._scanned_bits = self.status_bits
+        self.restored_bits = self.status_bits
+
+    def _record(self, spot_id):
+        if self.journal is None:
+            return
+        self.journal.append(spot_id, self.get_spot_status(spot_id), self._user_id(self.holder[spot_id]))
+        if self.journal.needs_compaction():
+            self.journal.compact({
+                spot_id: (data["status"], data["user"])
+                for spot_id, data in self.get_all_spot_statuses().items() if data["status"]
+            })
+
+    def restored_spots(self):
+        """저널에서 복원되어 아직 센서로 확인되지 않은 자리 번호 목록"""
+        return _bit_positions(self.restored_bits)
+
+    def confirm_spot(self, spot_id):
+        """센서로 확인된 자리를 복원 목록에서 제외, 복원 상태였으면 True"""
+        bit = 1 << spot_id
+        was_restored = bool(self.restored_bits & bit)
+        self.restored_bits &= ~bit
+        return was_restored
+
+    def _valid_spot(self, spot_id):
+        return isinstance(spot_id, int) and 1 <= spot_id <= self.num_spots
+
+    def _user_id(self, index):
+        return None if index == NO_USER else self.users[index]
 
     #우산 보관 상태 업데이트
     def update_spot_status(self, spot_id, new_status, user_id=None):
-        spot_idx = self._get_spot_index(spot_id)
-        if spot_idx is None:
+        if not self._valid_spot(spot_id):
             return False
-        
-        # 사용자 ID 유효성 검사
-        if user_id and self.user_spot_map.get(user_id) != spot_id:
-            if new_status: #우산이 새로 들어왔을 때에만 확인
-                 print(f"Warning: User {user_id} cannot use spot {spot_id}.")
-                 return False
 
-        current_spot = self.spots[spot_idx]
-        current_spot["previous_status"] = current_spot["status"]
-        current_spot["status"] = new_status
+        # 사용자 ID 유효성 검사 (우산이 새로 들어왔을 때에만 확인)
+        # user_id는 실제로 우산을 넣은 사용자이며, 다른 사람의 자리에 넣어도 그대로 기록
+        if user_id and new_status:
+            if not self.is_registered_user(user_id):
+                print(f"Warning: Unknown user {user_id} for spot {spot_id}.")
+                return False
+            if self.get_user_umbrella_spot(user_id) != spot_id:
+                print(f"Warning: User {user_id} put an umbrella in spot {spot_id} assigned to {self.get_spot_user(spot_id)}.")
 
+        bit = 1 << spot_id
+        self.previous_bits = (self.previous_bits & ~bit) | (self.status_bits & bit)
+        self.restored_bits &= ~bit
         if new_status:  # 우산이 새로 들어온 경우
-            current_spot["user"] = user_id
+            self.status_bits |= bit
+            self.holder[spot_id] = self.user_index.get(user_id, NO_USER)
         else:  # 우산이 사라진 경우
-            current_spot["user"] = None 
-        
+            self.status_bits &= ~bit
+            self.holder[spot_id] = NO_USER
+        self._record(spot_id)
         return True
+
     #우산 보관 상태 반환
     def get_spot_status(self, spot_id):
-        spot_idx = self._get_spot_index(spot_id)
-        if spot_idx is None:
+        if not self._valid_spot(spot_id):
             return None
-        
-        return self.spots[spot_idx]["status"]
+        return bool(self.status_bits >> spot_id & 1)
 
     def get_user_umbrella_spot(self, user_id):
-        return self.user_spot_map.get(user_id)
+        index = self.user_index.get(user_id)
+        return None if index is None else self.user_spot[index]
+
+    def get_spot_user(self, spot_id):
+        """자리에 배정된 사용자 ID"""
+        if not self._valid_spot(spot_id):
+            return None
+        return self._user_id(self.assigned[spot_id])
+
+    def is_registered_user(self, user_id):
+        return user_id in self.user_index
 
     #우산이 새로 들어왔는지 확인
     def has_umbrella_arrived(self, spot_id):
-        spot_idx = self._get_spot_index(spot_id)
-        if spot_idx is None:
+        if not self._valid_spot(spot_id):
             return False
-        
-        current_spot = self.spots[spot_idx]
-        return current_spot["status"] is True and current_spot["previous_status"] is False
+        bit = 1 << spot_id
+        return bool(self.status_bits & ~self.previous_bits & bit)
 
     #우산이 사라졌는지 확인
     def has_umbrella_taken(self, spot_id):
-        spot_idx = self._get_spot_index(spot_id)
-        if spot_idx is None:
+        if not self._valid_spot(spot_id):
             return False
-        
-        current_spot = self.spots[spot_idx]
-        return current_spot["status"] is False and current_spot["previous_status"] is True
+        bit = 1 << spot_id
+        return bool(~self.status_bits & self.previous_bits & bit)
 
     def reset_spot(self, spot_id):
-        spot_idx = self._get_spot_index(spot_id)
-        if spot_idx is None:
+        if not self._valid_spot(spot_id):
             return False
-        
-        current_spot = self.spots[spot_idx]
-        current_spot["status"] = False
-        current_spot["user"] = None
-        current_spot["previous_status"] = False
+        bit = 1 << spot_id
+        self.status_bits &= ~bit
+        self.previous_bits &= ~bit
+        self.holder[spot_id] = NO_USER
+        self.restored_bits &= ~bit
+        self._record(spot_id)
         return True
 
     def get_all_spot_statuses(self):
-        return {spot_id: {"status": data["status"], "user": data["user"]} for spot_id, data in self.spots.items()}
+        return {
+            spot_id: {"status": bool(self.status_bits >> spot_id & 1), "user": self._user_id(self.holder[spot_id])}
+            for spot_id in range(1, self.num_spots + 1)
+        }
+
+    def changed_spots(self, observed_bits):
+        """observed_bits(측정된 상태 비트셋)와 현재 상태가 다른 자리 번호 목록"""
+        return _bit_positions(self.status_bits ^ observed_bits)
+
+    def changes_since_last_scan(self):
+        """마지막 호출 이후 상태가 바뀐 자리 번호 목록"""
+        changed = self.changed_spots(self._scanned_bits)
+        self._scanned_bits = self.status_bits
+        return changed
+
 
+def _bit_positions(bits):
+    """설정된 비트 위치 목록 (변화한 자리 수에 비례하는 시간)"""
+    positions = []
+    while bits:
+        low = bits & -bits
+        positions.append(low.bit_length() - 1)
+        bits ^= low
+    return positions
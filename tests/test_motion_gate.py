@@ -0,0 +1,72 @@
+"""MotionGate must not slow down a decision on a motionless face."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+os.environ["UMBRELLA_BACKEND"] = "sim"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "ExternalSrc")]
+
+import faceRec  # noqa: E402
+
+
+class StillCamera:
+    """The same frame over and over (a person standing perfectly still)."""
+
+    def __init__(self):
+        self.frame = np.full((480, 640, 3), 90, dtype=np.uint8)
+        self.captured = 0
+
+    def capture_array(self):
+        self.captured += 1
+        return self.frame.copy()
+
+
+class FixedDetector(faceRec.FaceDetector):
+    name = "fixed"
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.calls = 0
+
+    def detect(self, img, min_size):
+        self.calls += 1
+        return list(self.faces)
+
+
+class SteadyRecognizer:
+    def predict(self, g):
+        return 0, 40.0
+
+
+class NullScreen:
+    def show(self, f, boxes=()):
+        pass
+
+
+def _run(det, motion_gate, timeout=10.0):
+    camera = StillCamera()
+    decision = faceRec.run_inference(
+        camera, det, SteadyRecognizer(), {0: "alice"},
+        motion_gate=motion_gate, screen=NullScreen(), timeout=timeout,
+        redetect_every=0,  # full-frame detection every frame keeps the box in place
+    )
+    return decision, camera.captured
+
+
+def test_gate_keeps_frames_to_decision():
+    ungated = _run(FixedDetector([(100, 80, 60, 60)]), motion_gate=False)
+    gated = _run(FixedDetector([(100, 80, 60, 60)]), motion_gate=True)
+    assert ungated[0] == gated[0] == "alice"
+    assert gated[1] == ungated[1]
+
+
+@pytest.mark.parametrize("motion_gate, fewer", [(False, False), (True, True)])
+def test_gate_skips_detection_on_an_empty_scene(motion_gate, fewer):
+    det = FixedDetector([])
+    decision, captured = _run(det, motion_gate=motion_gate, timeout=0.3)
+    assert decision == 0
+    assert (det.calls < captured) == fewer
@@ -0,0 +1,41 @@
+"""StateJournal replay after a power cut mid-record."""
+
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from state_journal import StateJournal  # noqa: E402
+
+
+def _journal(tmp_path):
+    return StateJournal(str(tmp_path / "journal.log"), str(tmp_path / "state.json"))
+
+
+def test_replay_restores_last_state(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append(1, True, "user_A")
+    journal.append(2, True, None)
+    journal.append(1, False, None)
+    journal.close()
+    assert _journal(tmp_path).load() == {1: (False, None), 2: (True, None)}
+
+
+def test_record_cut_before_its_newline_is_dropped(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append(2, True, "user_B")
+    journal.close()
+    # power cut after the JSON was written but before the newline
+    with open(tmp_path / "journal.log", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"spot": 1, "status": True, "user": "user_A", "t": 0}))
+
+    journal = _journal(tmp_path)
+    assert journal.load() == {2: (True, "user_B")}
+    assert (tmp_path / "journal.log").read_bytes().endswith(b"\n")  # torn tail truncated
+    journal.append(1, False, None)
+    journal.append(2, False, None)
+    journal.close()
+
+    assert _journal(tmp_path).load() == {1: (False, None), 2: (False, None)}
@@ -0,0 +1,149 @@
+"""WeatherService against a local Open-Meteo stand-in on 127.0.0.1."""
+
+import datetime
+import http.server
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ExternalSrc"))
+
+from weather import WeatherService  # noqa: E402
+
+
+def _forecast(pop: int) -> dict:
+    """24 hourly GMT slots from the current hour, every one at the given PoP."""
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    times = [(start + datetime.timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(24)]
+    return {"hourly": {"time": times, "precipitation_probability": [pop] * len(times)}}
+
+
+class _ForecastHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if server.status != 200:
+            self.send_error(server.status)
+            return
+        body = json.dumps(_forecast(server.pop)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def forecast_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ForecastHandler)
+    server.pop = 10
+    server.status = 200
+    server.requests = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1/forecast"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dead_url():
+    """URL of a local port nothing listens on (connection refused)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1/forecast"
+
+
+def _service(url, cache_path, **kwargs):
+    kwargs.setdefault("timeout", 2.0)
+    return WeatherService(37.26, 127.05, base_url=url, cache_path=str(cache_path), **kwargs)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def test_fresh_fetch(forecast_server, tmp_path):
+    cache = tmp_path / "weather_cache.json"
+    service = _service(forecast_server.url, cache)
+    try:
+        assert service.get_rain_level(default=-1) == -1  # nothing cached yet
+        assert service.refresh()
+        assert forecast_server.requests == 1
+        assert service.get_rain_level() == 1
+        assert not service.is_stale()
+        assert json.loads(cache.read_text(encoding="utf-8"))["lat"] == 37.26
+    finally:
+        service.stop()
+
+
+def test_stale_forecast_is_served_then_refreshed_in_background(forecast_server, tmp_path):
+    service = _service(forecast_server.url, tmp_path / "weather_cache.json", ttl=0.3)
+    service.start()
+    try:
+        assert _wait_for(lambda: service.get_rain_level() == 1)
+        forecast_server.pop = 80
+        time.sleep(0.4)  # past the TTL
+        assert service.is_stale()
+        requests_before = forecast_server.requests
+        # the stale value comes back at once; the call only wakes the refresh thread
+        assert service.get_rain_level() == 1
+        assert _wait_for(lambda: service.get_rain_level() == 3)
+        assert forecast_server.requests > requests_before
+    finally:
+        service.stop()
+
+
+def test_network_failure_keeps_cached_forecast(forecast_server, tmp_path, dead_url):
+    service = _service(forecast_server.url, tmp_path / "weather_cache.json")
+    try:
+        assert service.refresh()
+        forecast_server.pop = 80
+        forecast_server.status = 503
+        assert not service.refresh()
+        assert service.get_rain_level() == 1
+
+        service.base_url = dead_url
+        assert not service.refresh()
+        assert service.get_rain_level() == 1
+    finally:
+        service.stop()
+
+
+def test_reload_from_cache_file(forecast_server, tmp_path, dead_url):
+    cache = tmp_path / "weather_cache.json"
+    forecast_server.pop = 50
+    first = _service(forecast_server.url, cache)
+    try:
+        assert first.refresh()
+    finally:
+        first.stop()
+
+    reloaded = _service(dead_url, cache)
+    try:
+        assert reloaded.age() is not None
+        assert not reloaded.is_stale()
+        assert reloaded.get_rain_level() == 2
+    finally:
+        reloaded.stop()
+
+    elsewhere = WeatherService(35.18, 129.08, base_url=dead_url, cache_path=str(cache))
+    try:
+        assert elsewhere.age() is None  # cache is for another location
+    finally:
+        elsewhere.stop()